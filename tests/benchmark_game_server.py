@@ -0,0 +1,181 @@
+"""
+Benchmarks of the reference game model. Not collected by pytest, run it directly:
+
+    python benchmark_game_server.py --players 1000000
+"""
+
+import argparse
+import gc
+import json
+import tempfile
+import time
+import tracemalloc
+
+from pathlib import Path
+from typing import Callable, Union
+
+from game_server import GameServer, GameSession, Point
+from game_snapshot import SnapshotWriter, restore
+from lazy_session import LazyGameSession
+from sharded_server import ShardedGameServer
+from vectorized_session import VectorizedGameSession
+
+
+BENCHMARK_MAP = {
+    'id': 'benchmark',
+    'name': 'Benchmark',
+    'roads': [{'x0': 0, 'y0': 0, 'x1': 1000}],
+    'buildings': [],
+    'offices': [],
+}
+
+
+def measure_bytes_per_player(session_type: Callable, players: int) -> float:
+    gc.collect()
+    tracemalloc.start()
+    session = session_type(BENCHMARK_MAP, 1.0)
+    base, _ = tracemalloc.get_traced_memory()
+
+    for i in range(players):
+        session.add_player(f'Player {i}', f'{i:032x}', i, Point(float(i % 1000), 0.0))
+
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (used - base) / players
+
+
+def measure_snapshot(session_type: Callable, config_path: Path, players: int):
+    server = GameServer(config_path, session_type)
+    for i in range(players):
+        server.join(f'Player {i}', BENCHMARK_MAP['id'], f'{i:032x}', i, Point(float(i % 1000), 0.0))
+    writer = SnapshotWriter(server)
+
+    start = time.perf_counter()
+    snapshot = writer.save()
+    save_time = time.perf_counter() - start
+
+    # A tenth of the players turn, the rest stay in place
+    for i in range(0, players, 10):
+        server.move(f'{i:032x}', 'R')
+    server.tick(100)
+
+    start = time.perf_counter()
+    delta = writer.save_delta()
+    delta_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    restore(config_path, [snapshot, delta], session_type)
+    restore_time = time.perf_counter() - start
+
+    print(f'{session_type.__name__}, {players} players: '
+          f'save {save_time:.3f}s, {len(snapshot) / players:.1f} bytes per player; '
+          f'delta {delta_time:.3f}s, {len(delta)} bytes; restore {restore_time:.3f}s')
+
+
+def measure_sharded_tick(session_type: Callable, config_path: Path, maps: int, players: int, shards: int):
+    def tick_time(server: Union[GameServer, ShardedGameServer]) -> float:
+        for i in range(players):
+            token = f'{i:032x}'
+            server.join(f'Player {i}', f'{BENCHMARK_MAP["id"]}-{i % maps}', token, i, Point(float(i % 1000), 0.0))
+            server.move(token, 'R' if i % 2 else 'L')
+
+        start = time.perf_counter()
+        for _ in range(10):
+            server.tick(100)
+        return (time.perf_counter() - start) / 10
+
+    serial = tick_time(GameServer(config_path, session_type))
+    with ShardedGameServer(config_path, session_type, shards=shards) as server:
+        sharded = tick_time(server)
+
+    print(f'{session_type.__name__}, {players} players on {maps} maps: '
+          f'tick {serial:.3f}s serial, {sharded:.3f}s on {shards} shards')
+
+
+def measure_ticks_between_reads(session_type: Callable, players: int, ticks: int):
+    session = session_type(BENCHMARK_MAP, 1.0)
+    for i in range(players):
+        session.add_player(f'Player {i}', f'{i:032x}', i, Point(float(i % 1000), 0.0))
+    # A tenth of the players run, the rest stay in place
+    for i in range(0, players, 10):
+        session.move(f'{i:032x}', 'R')
+
+    start = time.perf_counter()
+    for _ in range(ticks):
+        session.tick(100)
+    tick_time = (time.perf_counter() - start) / ticks
+
+    start = time.perf_counter()
+    session.get_state()
+    read_time = time.perf_counter() - start
+
+    print(f'{session_type.__name__}, {players} players: '
+          f'tick {tick_time * 1000:.3f}ms, state read after {ticks} ticks {read_time:.3f}s')
+
+
+def measure_state_reads(session_type: Callable, players: int, reads: int):
+    session = session_type(BENCHMARK_MAP, 1.0)
+    for i in range(players):
+        session.add_player(f'Player {i}', f'{i:032x}', i, Point(float(i % 1000), 0.0))
+    for i in range(0, players, 100):
+        session.move(f'{i:032x}', 'R')
+    session.get_state()
+
+    start = time.perf_counter()
+    for _ in range(reads):
+        session.get_state()
+    repeated_time = (time.perf_counter() - start) / reads
+
+    # A hundredth of the players run, so a tick changes only them
+    session.tick(100)
+    start = time.perf_counter()
+    session.get_state()
+    changed_time = time.perf_counter() - start
+
+    version = session.state_version
+    session.tick(100)
+    start = time.perf_counter()
+    delta = session.get_state_delta(version)
+    delta_time = time.perf_counter() - start
+
+    print(f'{session_type.__name__}, {players} players: '
+          f'repeated state read {repeated_time * 1000:.3f}ms, read after a tick {changed_time * 1000:.1f}ms, '
+          f'delta of {len(delta["players"])} players after a tick {delta_time * 1000:.1f}ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Reference game model benchmarks')
+    parser.add_argument('--players', type=int, default=1_000_000)
+    parser.add_argument('--maps', type=int, default=8)
+    parser.add_argument('--shards', type=int, default=4)
+    parser.add_argument('--ticks', type=int, default=100)
+    args = parser.parse_args()
+
+    for session_type in [GameSession, LazyGameSession]:
+        measure_ticks_between_reads(session_type, args.players, args.ticks)
+
+    for session_type in [GameSession, VectorizedGameSession]:
+        measure_state_reads(session_type, args.players, args.ticks)
+
+    for session_type in [GameSession, VectorizedGameSession]:
+        bytes_per_player = measure_bytes_per_player(session_type, args.players)
+        print(f'{session_type.__name__}: {bytes_per_player:.1f} bytes per player, {args.players} players')
+
+    with tempfile.TemporaryDirectory() as directory:
+        config_path = Path(directory) / 'config.json'
+        config_path.write_text(json.dumps({'defaultDogSpeed': 1.0, 'maps': [BENCHMARK_MAP]}))
+
+        for session_type in [GameSession, VectorizedGameSession]:
+            players = 1000
+            while players <= args.players:
+                measure_snapshot(session_type, config_path, players)
+                players *= 10
+
+        maps = [dict(BENCHMARK_MAP, id=f'{BENCHMARK_MAP["id"]}-{i}') for i in range(args.maps)]
+        config_path.write_text(json.dumps({'defaultDogSpeed': 1.0, 'maps': maps}))
+        for session_type in [GameSession, VectorizedGameSession]:
+            measure_sharded_tick(session_type, config_path, args.maps, args.players, args.shards)
+
+
+if __name__ == '__main__':
+    main()
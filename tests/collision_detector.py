@@ -0,0 +1,227 @@
+"""
+Python reference of cpp/test_s03_gather-tests/collision_detector.h.
+The arithmetic repeats TryCollectPoint operation by operation, so the results match the C++ ones exactly
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from game_server import Point
+
+
+EVENT_DTYPE = np.dtype([
+    ('item_id', np.int64),
+    ('gatherer_id', np.int64),
+    ('sq_distance', np.float64),
+    ('time', np.float64),
+])
+
+# Upper bound of the (gatherer, item) candidate pairs processed at once
+MAX_BATCH_PAIRS = 1 << 22
+
+
+@dataclass
+class CollectionResult:
+
+    # Squared distance to the point
+    sq_distance: float
+    # Share of the segment passed before the closest approach
+    proj_ratio: float
+
+    def is_collected(self, collect_radius: float) -> bool:
+        return 0 <= self.proj_ratio <= 1 and self.sq_distance <= collect_radius * collect_radius
+
+
+@dataclass
+class Item:
+    position: Point
+    width: float
+
+
+@dataclass
+class Gatherer:
+    start_pos: Point
+    end_pos: Point
+    width: float
+
+
+@dataclass
+class GatheringEvent:
+    item_id: int
+    gatherer_id: int
+    sq_distance: float
+    time: float
+
+
+def try_collect_point(a: Point, b: Point, c: Point) -> CollectionResult:
+    """
+    Moving from the point a to the point b, trying to collect the point c
+    """
+    # Exact comparison, as even the smallest move has to be taken into account
+    assert b.x != a.x or b.y != a.y
+    u_x = c.x - a.x
+    u_y = c.y - a.y
+    v_x = b.x - a.x
+    v_y = b.y - a.y
+    u_dot_v = u_x * v_x + u_y * v_y
+    u_len2 = u_x * u_x + u_y * u_y
+    v_len2 = v_x * v_x + v_y * v_y
+    proj_ratio = u_dot_v / v_len2
+    sq_distance = u_len2 - (u_dot_v * u_dot_v) / v_len2
+
+    return CollectionResult(sq_distance, proj_ratio)
+
+
+class ItemGrid:
+    """
+    Broad phase: items bucketed into a uniform grid, stored as a CSR table sorted by the cell id
+    """
+
+    def __init__(self, positions: np.ndarray, cell_size: float):
+        self.cell_size = cell_size
+
+        cells = np.floor(positions / cell_size).astype(np.int64)
+        self.origin = cells.min(axis=0) if len(cells) else np.zeros(2, dtype=np.int64)
+        self.shape = (cells.max(axis=0) - self.origin + 1) if len(cells) else np.zeros(2, dtype=np.int64)
+
+        cell_ids = self.flat_ids(cells)
+        self.items = np.argsort(cell_ids, kind='stable')
+        self.offsets = np.zeros(int(self.shape.prod()) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cell_ids, minlength=len(self.offsets) - 1), out=self.offsets[1:])
+
+    def flat_ids(self, cells: np.ndarray) -> np.ndarray:
+        local = cells - self.origin
+        return local[:, 0] * self.shape[1] + local[:, 1]
+
+    def cell_ranges(self, left_bottom: np.ndarray, right_top: np.ndarray):
+        """
+        Inclusive ranges of the grid cells overlapped by the boxes, clipped to the grid
+        """
+        lower = np.maximum(np.floor(left_bottom / self.cell_size).astype(np.int64) - self.origin, 0)
+        upper = np.minimum(np.floor(right_top / self.cell_size).astype(np.int64) - self.origin, self.shape - 1)
+        return lower, upper
+
+
+def estimate_cell_size(item_positions: np.ndarray, starts: np.ndarray, ends: np.ndarray,
+                       reach: np.ndarray) -> float:
+    # A gatherer box should cover a few cells, but the cells shouldn't be much sparser than the items
+    box_side = np.mean(np.abs(ends - starts).max(axis=1) + 2 * reach)
+    extent = np.ptp(np.concatenate([item_positions, starts, ends]), axis=0).max()
+    density_side = extent / max(np.sqrt(len(item_positions)), 1.0)
+    size = max(box_side, density_side)
+    return float(size) if size > 0 else 1.0
+
+
+def find_gather_events_arrays(item_positions: np.ndarray, item_widths: np.ndarray,
+                              gatherer_starts: np.ndarray, gatherer_ends: np.ndarray, gatherer_widths: np.ndarray,
+                              cell_size: Optional[float] = None) -> np.ndarray:
+    """
+    FindGatherEvents over the arrays of the item positions (n, 2) and widths (n,),
+    and the gatherer start and end positions (m, 2) and widths (m,).
+    Returns an EVENT_DTYPE array sorted by time, ties are ordered by the gatherer and then by the item
+    """
+    item_positions = np.asarray(item_positions, dtype=np.float64).reshape(-1, 2)
+    item_widths = np.asarray(item_widths, dtype=np.float64)
+    starts = np.asarray(gatherer_starts, dtype=np.float64).reshape(-1, 2)
+    ends = np.asarray(gatherer_ends, dtype=np.float64).reshape(-1, 2)
+    gatherer_widths = np.asarray(gatherer_widths, dtype=np.float64)
+
+    moving = np.flatnonzero((starts != ends).any(axis=1))
+    if len(item_positions) == 0 or len(moving) == 0:
+        return np.zeros(0, dtype=EVENT_DTYPE)
+
+    # Any collected item lies in the gatherer box expanded by the collect radius,
+    # the margin covers the rounding of the squared distance
+    reach = gatherer_widths[moving] + item_widths.max()
+    reach = reach * (1 + 1e-9) + 1e-9
+    left_bottom = np.minimum(starts[moving], ends[moving]) - reach[:, np.newaxis]
+    right_top = np.maximum(starts[moving], ends[moving]) + reach[:, np.newaxis]
+
+    if cell_size is None:
+        cell_size = estimate_cell_size(item_positions, starts[moving], ends[moving], reach)
+    grid = ItemGrid(item_positions, cell_size)
+    lower, upper = grid.cell_ranges(left_bottom, right_top)
+    cells_x = np.maximum(upper[:, 0] - lower[:, 0] + 1, 0)
+    cells_y = np.maximum(upper[:, 1] - lower[:, 1] + 1, 0)
+
+    # Candidate (gatherer, cell) pairs: every gatherer overlaps a rectangle of cells
+    cell_counts = cells_x * cells_y
+    pair_gatherers = np.repeat(np.arange(len(moving)), cell_counts)
+    rank = np.arange(len(pair_gatherers)) - np.repeat(np.cumsum(cell_counts) - cell_counts, cell_counts)
+    pair_x = lower[pair_gatherers, 0] + rank // cells_y[pair_gatherers]
+    pair_y = lower[pair_gatherers, 1] + rank % cells_y[pair_gatherers]
+    pair_cells = pair_x * grid.shape[1] + pair_y
+
+    cell_starts = grid.offsets[pair_cells]
+    item_counts = grid.offsets[pair_cells + 1] - cell_starts
+
+    events: List[np.ndarray] = list()
+    total = np.cumsum(item_counts)
+    batch_begin = 0
+    while batch_begin < len(pair_cells):
+        # Batches of whole (gatherer, cell) pairs with a bounded number of candidate items
+        done = total[batch_begin - 1] if batch_begin else 0
+        batch_end = int(np.searchsorted(total, done + MAX_BATCH_PAIRS, side='right'))
+        batch_end = max(batch_end, batch_begin + 1)
+        batch = slice(batch_begin, batch_end)
+        batch_begin = batch_end
+
+        counts = item_counts[batch]
+        gatherers = np.repeat(pair_gatherers[batch], counts)
+        offsets = np.arange(len(gatherers)) - np.repeat(np.cumsum(counts) - counts, counts)
+        items = grid.items[np.repeat(cell_starts[batch], counts) + offsets]
+        events.append(collect(item_positions, item_widths, starts, ends, gatherer_widths,
+                              moving[gatherers], items))
+
+    if len(events) == 0:
+        return np.zeros(0, dtype=EVENT_DTYPE)
+
+    events = np.concatenate(events)
+    order = np.lexsort((events['item_id'], events['gatherer_id'], events['time']))
+    return events[order]
+
+
+def collect(item_positions: np.ndarray, item_widths: np.ndarray,
+            starts: np.ndarray, ends: np.ndarray, gatherer_widths: np.ndarray,
+            gatherers: np.ndarray, items: np.ndarray) -> np.ndarray:
+    """
+    Narrow phase: vectorized TryCollectPoint and IsCollected over the candidate pairs
+    """
+    a = starts[gatherers]
+    b = ends[gatherers]
+    c = item_positions[items]
+
+    u_x = c[:, 0] - a[:, 0]
+    u_y = c[:, 1] - a[:, 1]
+    v_x = b[:, 0] - a[:, 0]
+    v_y = b[:, 1] - a[:, 1]
+    u_dot_v = u_x * v_x + u_y * v_y
+    u_len2 = u_x * u_x + u_y * u_y
+    v_len2 = v_x * v_x + v_y * v_y
+    proj_ratio = u_dot_v / v_len2
+    sq_distance = u_len2 - (u_dot_v * u_dot_v) / v_len2
+
+    collect_radius = gatherer_widths[gatherers] + item_widths[items]
+    collected = (proj_ratio >= 0) & (proj_ratio <= 1) & (sq_distance <= collect_radius * collect_radius)
+
+    events = np.zeros(np.count_nonzero(collected), dtype=EVENT_DTYPE)
+    events['item_id'] = items[collected]
+    events['gatherer_id'] = gatherers[collected]
+    events['sq_distance'] = sq_distance[collected]
+    events['time'] = proj_ratio[collected]
+    return events
+
+
+def find_gather_events(items: Sequence[Item], gatherers: Sequence[Gatherer]) -> List[GatheringEvent]:
+    item_positions = np.array([[item.position.x, item.position.y] for item in items], dtype=np.float64)
+    item_widths = np.array([item.width for item in items], dtype=np.float64)
+    starts = np.array([[g.start_pos.x, g.start_pos.y] for g in gatherers], dtype=np.float64)
+    ends = np.array([[g.end_pos.x, g.end_pos.y] for g in gatherers], dtype=np.float64)
+    widths = np.array([g.width for g in gatherers], dtype=np.float64)
+
+    events = find_gather_events_arrays(item_positions, item_widths, starts, ends, widths)
+    return [GatheringEvent(*event) for event in events.tolist()]
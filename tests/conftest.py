@@ -1,5 +1,4 @@
 import os
-import json
 
 import pytest
 
@@ -9,10 +8,12 @@ from contextlib import contextmanager
 from typing import Set
 
 from cpp_server_api import CppServer as Server
+from game_server import load_catalog
 
 
 def get_maps_from_config_file(config: Path):
-    return json.loads(config.read_text())['maps']
+    # The maps are shared by the whole test session, so they must not be modified
+    return load_catalog(config).config['maps']
 
 
 def pytest_generate_tests(metafunc):
@@ -32,7 +33,7 @@ def pytest_generate_tests(metafunc):
             config_path = Path(config_path)
             metafunc.parametrize(
                 'config',
-                json.loads(config_path.read_text())
+                load_catalog(config_path).config
             )
     if 'map_id' in metafunc.fixturenames:
         if config_path:
@@ -41,7 +42,7 @@ def pytest_generate_tests(metafunc):
                 'map_id',
                 [
                     pytest.param(map_dict['id'], id=map_dict['id'])
-                    for map_dict in json.loads(config_path.read_text())['maps']
+                    for map_dict in get_maps_from_config_file(config_path)
                 ],
             )
 
@@ -64,8 +65,10 @@ def _make_server(xprocess):
 
     _, output_path = xprocess.ensure("server", Starter)
 
-    yield Server(f'http://{server_domain}:{server_port}/', output_path)
+    server = Server(f'http://{server_domain}:{server_port}/', output_path)
+    yield server
 
+    server.close()
     xprocess.getinfo("server").terminate()
 
 
@@ -0,0 +1,134 @@
+// Runs FindGatherEvents on a binary scenario written by tests/gather_scenarios.py
+// and writes the detected events in the binary format the script reads back.
+//
+// Usage: collision_detection_scenario_runner <scenario file> <events file>
+// Prints {"elapsed": <seconds of FindGatherEvents>, "events": <count>} to stdout.
+
+#include <chrono>
+#include <cstdint>
+#include <cstring>
+#include <fstream>
+#include <iostream>
+#include <stdexcept>
+#include <vector>
+
+#include "../src/collision_detector.h"
+
+namespace {
+
+constexpr char SCENARIO_MAGIC[4] = {'G', 'T', 'H', 'R'};
+constexpr uint32_t SCENARIO_VERSION = 1;
+
+class VectorItemGathererProvider : public collision_detector::ItemGathererProvider {
+public:
+    VectorItemGathererProvider(std::vector<collision_detector::Item> items,
+                               std::vector<collision_detector::Gatherer> gatherers)
+        : items_(std::move(items))
+        , gatherers_(std::move(gatherers)) {
+    }
+
+    size_t ItemsCount() const override {
+        return items_.size();
+    }
+    collision_detector::Item GetItem(size_t idx) const override {
+        return items_[idx];
+    }
+    size_t GatherersCount() const override {
+        return gatherers_.size();
+    }
+    collision_detector::Gatherer GetGatherer(size_t idx) const override {
+        return gatherers_[idx];
+    }
+
+private:
+    std::vector<collision_detector::Item> items_;
+    std::vector<collision_detector::Gatherer> gatherers_;
+};
+
+template <typename T>
+T Read(std::istream& in) {
+    T value;
+    if (!in.read(reinterpret_cast<char*>(&value), sizeof(value))) {
+        throw std::runtime_error("Unexpected end of the scenario file");
+    }
+    return value;
+}
+
+template <typename T>
+void Write(std::ostream& out, T value) {
+    out.write(reinterpret_cast<const char*>(&value), sizeof(value));
+}
+
+VectorItemGathererProvider ReadScenario(const char* path) {
+    std::ifstream in(path, std::ios::binary);
+    if (!in) {
+        throw std::runtime_error("Unable to open the scenario file");
+    }
+
+    char magic[4];
+    in.read(magic, sizeof(magic));
+    if (!in || std::memcmp(magic, SCENARIO_MAGIC, sizeof(magic)) != 0
+        || Read<uint32_t>(in) != SCENARIO_VERSION) {
+        throw std::runtime_error("Unsupported scenario file");
+    }
+
+    const auto items_count = Read<uint64_t>(in);
+    const auto gatherers_count = Read<uint64_t>(in);
+
+    std::vector<collision_detector::Item> items;
+    items.reserve(items_count);
+    for (uint64_t i = 0; i < items_count; ++i) {
+        const auto x = Read<double>(in);
+        const auto y = Read<double>(in);
+        const auto width = Read<double>(in);
+        items.push_back({{x, y}, width});
+    }
+
+    std::vector<collision_detector::Gatherer> gatherers;
+    gatherers.reserve(gatherers_count);
+    for (uint64_t i = 0; i < gatherers_count; ++i) {
+        const auto start_x = Read<double>(in);
+        const auto start_y = Read<double>(in);
+        const auto end_x = Read<double>(in);
+        const auto end_y = Read<double>(in);
+        const auto width = Read<double>(in);
+        gatherers.push_back({{start_x, start_y}, {end_x, end_y}, width});
+    }
+
+    return {std::move(items), std::move(gatherers)};
+}
+
+}  // namespace
+
+int main(int argc, const char* argv[]) {
+    if (argc != 3) {
+        std::cerr << "Usage: " << argv[0] << " <scenario file> <events file>" << std::endl;
+        return EXIT_FAILURE;
+    }
+
+    try {
+        const auto provider = ReadScenario(argv[1]);
+
+        const auto start = std::chrono::steady_clock::now();
+        const auto events = collision_detector::FindGatherEvents(provider);
+        const std::chrono::duration<double> elapsed = std::chrono::steady_clock::now() - start;
+
+        std::ofstream out(argv[2], std::ios::binary);
+        for (const auto& event : events) {
+            Write<uint64_t>(out, event.item_id);
+            Write<uint64_t>(out, event.gatherer_id);
+            Write<double>(out, event.sq_distance);
+            Write<double>(out, event.time);
+        }
+        if (!out) {
+            throw std::runtime_error("Unable to write the events file");
+        }
+
+        std::cout << "{\"elapsed\": " << elapsed.count() << ", \"events\": " << events.size() << "}"
+                  << std::endl;
+    } catch (const std::exception& ex) {
+        std::cerr << ex.what() << std::endl;
+        return EXIT_FAILURE;
+    }
+    return EXIT_SUCCESS;
+}
@@ -1,10 +1,35 @@
 import json
+import asyncio
+import functools
+import threading
 
 import requests
 
+from abc import ABC, abstractmethod
+from requests.adapters import HTTPAdapter
+
 from urllib.parse import urljoin
 from pathlib import Path
-from typing import Optional, Tuple, List, Union, Type, KeysView, Any
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple, List, Union, Type, KeysView, Any, Callable, Dict, Sequence, Iterable, Iterator
+
+from json_stream import JsonStream
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def decode_json(content: bytes) -> Any:
+    return json.loads(content)
+
+
+# orjson decodes large payloads several times faster, it's used when it's installed. Unlike json, it rejects
+# NaN, Infinity and integers beyond 64 bits. A decoder takes the raw body and raises ValueError,
+# e.g. json.JSONDecodeError, if it's not a valid JSON
+DEFAULT_DECODER: Callable[[bytes], Any] = orjson.loads if orjson is not None else decode_json
 
 
 class ServerException(Exception):
@@ -130,61 +155,465 @@ class BadRequest(ServerException):
     """
 
 
+class SchemaEmitter:
+    """
+    Source of a generated validator: indented lines, and the constants they refer to by name
+    """
+
+    def __init__(self):
+        self.lines: List[str] = list()
+        self.constants: Dict[str, Any] = dict()
+        self.depth = 1
+        self.variables = 0
+
+    def line(self, text: str):
+        self.lines.append('    ' * self.depth + text)
+
+    @contextmanager
+    def block(self, header: str):
+        self.line(header)
+        self.depth += 1
+        start = len(self.lines)
+        yield
+        if len(self.lines) == start:
+            self.line('pass')
+        self.depth -= 1
+
+    def constant(self, value: Any) -> str:
+        name = f'c{len(self.constants)}'
+        self.constants[name] = value
+        return name
+
+    def variable(self) -> str:
+        self.variables += 1
+        return f'v{self.variables}'
+
+    def name(self, name: str, key: Optional[str]) -> str:
+        """
+        Expression of an object name for the error. A `{}` in the name is replaced by the key of the object,
+        which is formatted only when the error is raised
+        """
+        if key is not None and '{}' in name:
+            return f'{self.constant(name)}.format({key})'
+        return self.constant(name)
+
+
+class Schema(ABC):
+    """
+    Declarative description of a JSON value. `compile_validator` turns it into a function, generated once,
+    that checks a value with all the checks inlined and raises the same exceptions as `CppServer.assert_type`
+    and `CppServer.assert_fields`
+    """
+
+    @abstractmethod
+    def emit(self, emitter: SchemaEmitter, value: str, key: Optional[str], parent: Optional[str]):
+        """
+        Emits the checks of `value`, an expression in the generated code. `key` is the expression
+        of its key or index in `parent`, for the error names
+        """
+
+    def emit_type(self, emitter: SchemaEmitter, value: str, key: Optional[str], parent: Optional[str]):
+        """
+        Emits only the type checks of `value`. An Object checks the types of all its fields first,
+        then the rest of every field, so a wrong top-level type is found before any nested error
+        """
+
+    def emit_contents(self, emitter: SchemaEmitter, value: str, key: Optional[str], parent: Optional[str]):
+        """
+        Emits the checks of `value` that `emit_type` leaves out
+        """
+        self.emit(emitter, value, key, parent)
+
+
+class OfType(Schema):
+    """
+    The value is exactly of one of the types, as `CppServer.assert_type` checks
+    """
+
+    def __init__(self, name: str, *types: Type):
+        self.name = name
+        self.types = list(types)
+
+    def emit(self, emitter: SchemaEmitter, value: str, key: Optional[str], parent: Optional[str]):
+        condition = ' and '.join(f'type({value}) is not {emitter.constant(t)}' for t in self.types)
+        with emitter.block(f'if {condition}:'):
+            emitter.line(f'raise WrongType({emitter.name(self.name, key)}, {emitter.constant(self.types)}, '
+                         f'type({value}))')
+
+    def emit_type(self, emitter: SchemaEmitter, value: str, key: Optional[str], parent: Optional[str]):
+        self.emit(emitter, value, key, parent)
+
+    def emit_contents(self, emitter: SchemaEmitter, value: str, key: Optional[str], parent: Optional[str]):
+        pass
+
+
+class OneOf(Schema):
+
+    def __init__(self, name: str, values: Sequence[Any]):
+        self.name = name
+        self.values = list(values)
+
+    def emit(self, emitter: SchemaEmitter, value: str, key: Optional[str], parent: Optional[str]):
+        with emitter.block(f'if {value} not in {emitter.constant(frozenset(self.values))}:'):
+            emitter.line(f'raise UnexpectedData({emitter.name(self.name, key)}, {emitter.constant(self.values)}, '
+                         f'{value})')
+
+
+class Check(Schema):
+    """
+    Arbitrary check of the value: `error(value, parent)` is raised unless `predicate(value)` holds
+    """
+
+    def __init__(self, predicate: Callable[[Any], bool], error: Callable[[Any, Any], Exception]):
+        self.predicate = predicate
+        self.error = error
+
+    def emit(self, emitter: SchemaEmitter, value: str, key: Optional[str], parent: Optional[str]):
+        with emitter.block(f'if not {emitter.constant(self.predicate)}({value}):'):
+            emitter.line(f'raise {emitter.constant(self.error)}({value}, {parent})')
+
+
+class AllOf(Schema):
+
+    def __init__(self, *schemas: Schema):
+        self.schemas = schemas
+
+    def emit(self, emitter: SchemaEmitter, value: str, key: Optional[str], parent: Optional[str]):
+        for schema in self.schemas:
+            schema.emit(emitter, value, key, parent)
+
+    def emit_type(self, emitter: SchemaEmitter, value: str, key: Optional[str], parent: Optional[str]):
+        for schema in self.schemas:
+            schema.emit_type(emitter, value, key, parent)
+
+    def emit_contents(self, emitter: SchemaEmitter, value: str, key: Optional[str], parent: Optional[str]):
+        for schema in self.schemas:
+            schema.emit_contents(emitter, value, key, parent)
+
+
+class ListOf(Schema):
+
+    def __init__(self, name: str, items: Schema):
+        self.type = OfType(name, list)
+        self.items = items
+
+    def emit(self, emitter: SchemaEmitter, value: str, key: Optional[str], parent: Optional[str]):
+        self.emit_type(emitter, value, key, parent)
+        self.emit_contents(emitter, value, key, parent)
+
+    def emit_type(self, emitter: SchemaEmitter, value: str, key: Optional[str], parent: Optional[str]):
+        self.type.emit(emitter, value, key, parent)
+
+    def emit_contents(self, emitter: SchemaEmitter, value: str, key: Optional[str], parent: Optional[str]):
+        item = emitter.variable()
+        with emitter.block(f'for {item} in {value}:'):
+            self.items.emit(emitter, item, None, value)
+
+
+class MapOf(Schema):
+    """
+    JSON object with arbitrary keys, e.g. players by id
+    """
+
+    def __init__(self, name: str, keys: Optional[Schema], values: Schema):
+        self.type = OfType(name, dict)
+        self.keys = keys
+        self.values = values
+
+    def emit(self, emitter: SchemaEmitter, value: str, key: Optional[str], parent: Optional[str]):
+        self.emit_type(emitter, value, key, parent)
+        self.emit_contents(emitter, value, key, parent)
+
+    def emit_type(self, emitter: SchemaEmitter, value: str, key: Optional[str], parent: Optional[str]):
+        self.type.emit(emitter, value, key, parent)
+
+    def emit_contents(self, emitter: SchemaEmitter, value: str, key: Optional[str], parent: Optional[str]):
+        item_key = emitter.variable()
+        item = emitter.variable()
+        with emitter.block(f'for {item_key}, {item} in {value}.items():'):
+            if self.keys is not None:
+                self.keys.emit(emitter, item_key, None, value)
+            self.values.emit(emitter, item, item_key, value)
+
+
+class Object(Schema):
+    """
+    JSON object with known keys. The `required` keys must be present, `fields` are checked even when absent,
+    as None, like `dict.get` gives them, and `optional` ones only when present. The keys may have to be
+    one of the `key_sets` exactly, and every value may have to match `each`
+    """
+
+    def __init__(self, name: str, fields: Optional[Dict[str, Schema]] = None, required: Iterable[str] = (),
+                 required_name: Optional[str] = None, optional: Optional[Dict[str, Schema]] = None,
+                 key_sets: Sequence[Sequence[str]] = (), key_sets_name: str = '', each: Optional[Schema] = None):
+        self.type = OfType(name, dict)
+        self.name = name
+        self.fields = fields or dict()
+        self.required = list(required)
+        self.required_name = required_name or name
+        self.optional = optional or dict()
+        self.key_sets = [list(key_set) for key_set in key_sets]
+        self.key_sets_name = key_sets_name
+        self.each = each
+
+    def emit(self, emitter: SchemaEmitter, value: str, key: Optional[str], parent: Optional[str]):
+        self.emit_type(emitter, value, key, parent)
+        self.emit_contents(emitter, value, key, parent)
+
+    def emit_type(self, emitter: SchemaEmitter, value: str, key: Optional[str], parent: Optional[str]):
+        self.type.emit(emitter, value, key, parent)
+
+    def emit_contents(self, emitter: SchemaEmitter, value: str, key: Optional[str], parent: Optional[str]):
+        if len(self.required) != 0:
+            condition = ' or '.join(f'{required!r} not in {value}' for required in self.required)
+            with emitter.block(f'if {condition}:'):
+                emitter.line(f'raise WrongFields({emitter.name(self.required_name, key)}, '
+                             f'list({emitter.constant(self.required)}), list({value}.keys()))')
+
+        if len(self.key_sets) != 0:
+            # The keys are known in every branch, so `each` is unrolled over them
+            keys = emitter.variable()
+            emitter.line(f'{keys} = {value}.keys()')
+            for i, key_set in enumerate(self.key_sets):
+                with emitter.block(f'{"if" if i == 0 else "elif"} {keys} == {emitter.constant(set(key_set))}:'):
+                    for field in key_set if self.each is not None else []:
+                        item = emitter.variable()
+                        emitter.line(f'{item} = {value}[{field!r}]')
+                        self.each.emit(emitter, item, repr(field), value)
+            with emitter.block('else:'):
+                emitter.line(f'raise WrongFields({emitter.name(self.name, key)}, '
+                             f'{emitter.constant(self.key_sets_name)}, list({keys}))')
+        elif self.each is not None:
+            item_key = emitter.variable()
+            item = emitter.variable()
+            with emitter.block(f'for {item_key}, {item} in {value}.items():'):
+                self.each.emit(emitter, item, item_key, value)
+
+        # The types of all the fields are checked before descending into any of them
+        items: Dict[str, str] = dict()
+        for field, schema in self.fields.items():
+            items[field] = emitter.variable()
+            emitter.line(f'{items[field]} = {value}.get({field!r})')
+            schema.emit_type(emitter, items[field], repr(field), value)
+        for field, schema in self.optional.items():
+            with emitter.block(f'if {field!r} in {value}:'):
+                items[field] = emitter.variable()
+                emitter.line(f'{items[field]} = {value}[{field!r}]')
+                schema.emit_type(emitter, items[field], repr(field), value)
+
+        for field, schema in self.fields.items():
+            schema.emit_contents(emitter, items[field], repr(field), value)
+        for field, schema in self.optional.items():
+            with emitter.block(f'if {field!r} in {value}:'):
+                schema.emit_contents(emitter, items[field], repr(field), value)
+
+
+def compile_validator(schema: Schema, name: str) -> Callable[[Any], None]:
+    """
+    Generates the validation function of the schema, it's done once per schema
+    """
+    emitter = SchemaEmitter()
+    schema.emit(emitter, 'value', None, None)
+    source = '\n'.join([f'def {name}(value):'] + (emitter.lines or ['    pass']))
+
+    namespace = dict(emitter.constants, WrongType=WrongType, WrongFields=WrongFields, UnexpectedData=UnexpectedData)
+    exec(compile(source, f'<{name} schema>', 'exec'), namespace)
+    validator = namespace[name]
+    validator.source = source
+    return validator
+
+
+@functools.lru_cache(maxsize=None)
+def get_validator(schema: Schema) -> Callable[[Any], None]:
+    return compile_validator(schema, 'validate')
+
+
+def stream_object(stream: JsonStream, schema: Object) -> Iterator[Tuple[str, Union[str, int, None], Any]]:
+    """
+    Validates a JSON object while it's read from the stream, and yields its fields as (field, None, value).
+    ListOf and MapOf fields are read item by item instead: (field, None, []) or (field, None, {}) is yielded
+    when the container starts, so an empty one is told from a missing one, then every item is validated
+    as soon as it's complete and yielded as (field, index or key, item), so only one item is kept in memory.
+    An item is checked by the validator of its field given a single-item container, so the errors are
+    the same as for the whole value. The required fields are checked at the end of the object,
+    after the items before it have been yielded
+    """
+    if schema.each is not None or len(schema.key_sets) != 0:
+        raise ValueError(f'{schema.name} can\'t be streamed, its keys are checked all at once')
+
+    if stream.peek() != '{':
+        get_validator(schema)(stream.value())    # Raises the type error of the object
+        return
+
+    seen: Dict[str, None] = dict()
+    for field in stream.members():
+        seen[field] = None
+        field_schema = schema.fields.get(field, schema.optional.get(field))
+        if isinstance(field_schema, ListOf) and stream.peek() == '[':
+            validate = get_validator(field_schema)
+            yield field, None, []
+            for index, _ in enumerate(stream.items()):
+                item = stream.value()
+                validate([item])
+                yield field, index, item
+        elif isinstance(field_schema, MapOf) and stream.peek() == '{':
+            validate = get_validator(field_schema)
+            yield field, None, {}
+            for key in stream.members():
+                item = stream.value()
+                validate({key: item})
+                yield field, key, item
+        else:
+            value = stream.value()
+            if field_schema is not None:
+                get_validator(field_schema)(value)
+            yield field, None, value
+
+    if any(required not in seen for required in schema.required):
+        raise WrongFields(schema.required_name, list(schema.required), list(seen))
+    for field, field_schema in schema.fields.items():
+        if field not in seen:
+            get_validator(field_schema)(None)
+
+
+COORDINATE = (float, int)
+
+MAP_LIST_SCHEMA = ListOf('Map list', Object('Map', required=['id', 'name'], fields={
+    'id': OfType('Map id', str),
+    'name': OfType('Map name', str),
+}))
+
+MAP_SCHEMA = Object('Map', required=['id', 'name', 'roads', 'buildings', 'offices'], fields={
+    'id': OfType('id', str),
+    'name': OfType('name', str),
+    'roads': ListOf('roads', Object('Road', key_sets=[['x0', 'y0', 'x1'], ['x0', 'y0', 'y1']],
+                                    key_sets_name='["x0", "y0", "x1"] or ["x0", "y0", "y1"]',
+                                    each=OfType('Road coordinate {}', *COORDINATE))),
+    'buildings': ListOf('buildings', Object('Building on the map', required=['x', 'y', 'w', 'h'],
+                                            each=OfType('Building field {}', *COORDINATE), fields={
+        size: Check(lambda value: value > 0,
+                    lambda _, building: DataInconsistency('Building size is\'t positive', {'building': building}))
+        for size in ['w', 'h']
+    })),
+    'offices': ListOf('offices', Object('Office', required=['id', 'x', 'y', 'offsetX', 'offsetY'],
+                                        required_name='Office on the map', fields={
+        'id': OfType('Office field id', str),
+        **{field: OfType(f'Office field {field}', *COORDINATE) for field in ['x', 'y', 'offsetX', 'offsetY']},
+    })),
+}, optional={
+    'dogSpeed': AllOf(OfType('dogSpeed', float),
+                      Check(lambda value: value >= 0,
+                            lambda value, _: DataInconsistency('Dog speed can\'t be negative', {'dog speed': value}))),
+})
+
+PLAYER_STATE_SCHEMA = Object('player_id', required=['pos', 'speed', 'dir'], required_name='Player state', fields={
+    'pos': ListOf('pos', OfType('Player position', float)),
+    'speed': ListOf('speed', OfType('Player speed', float)),
+    'dir': AllOf(OfType('dir', str), OneOf('Player direction', ['R', 'L', 'U', 'D', ''])),
+})
+
+STATE_SCHEMA = Object('Game state', fields={
+    'players': MapOf('Game state, players', OfType('Player id', str, int), PLAYER_STATE_SCHEMA),
+})
+
+STATE_DELTA_SCHEMA = Object('Game state delta', required=['version', 'full', 'players', 'removed'], fields={
+    'version': OfType('Game state delta, version', int),
+    'full': OfType('Game state delta, full', bool),
+    'players': MapOf('Game state delta, players', None, PLAYER_STATE_SCHEMA),
+    'removed': ListOf('Game state delta, removed', OfType('Removed player id', str)),
+}, optional={
+    'lostObjects': OfType('Game state delta, lost objects', dict),
+})
+
+
+# Size of the chunks a streamed body is read in
+STREAM_CHUNK_SIZE = 1 << 16
+
+
 class CppServer:
 
-    def __init__(self, url: str, output: Optional[Path] = None):
+    def __init__(self, url: str, output: Optional[Path] = None, pool_size: int = 10, keep_alive: bool = True,
+                 decoder: Callable[[bytes], Any] = DEFAULT_DECODER):
         self.url = url
+        self.decoder = decoder
+        self.file = None
         if output:
             self.file = open(output)
 
+        # Connection pools of the adapter are thread-safe, unlike requests.Session,
+        # so every thread gets its own session on top of the shared adapter
+        self.keep_alive = keep_alive
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.local = threading.local()
+
+    @property
+    def session(self) -> requests.Session:
+        session: Optional[requests.Session] = getattr(self.local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.mount('http://', self.adapter)
+            session.mount('https://', self.adapter)
+            if not self.keep_alive:
+                session.headers['Connection'] = 'close'
+            self.local.session = session
+        return session
+
+    def close(self):
+        self.adapter.close()
+        if self.file:
+            self.file.close()
+
     def get_line(self):
         return self.file.readline()
 
     def get_log(self):
         return json.loads(self.get_line())
 
-    def request(self, method, header, url, **kwargs):
+    def request(self, method, header, url, stream: bool = False, **kwargs):
         try:
+            if not self.keep_alive:
+                header = dict(header or {}, Connection='close')
             req = requests.Request(method, urljoin(self.url, url), headers=header, **kwargs).prepare()
-            with requests.Session() as session:
-                return session.send(req)
+            return self.session.send(req, stream=stream)
         except Exception as ex:
             print(ex)
 
     def get(self, endpoint):
-        return requests.get(urljoin(self.url, endpoint))
+        return self.session.get(urljoin(self.url, endpoint))
 
     def post(self, endpoint, data):
-        return requests.post(urljoin(self.url, endpoint), data)
+        return self.session.post(urljoin(self.url, endpoint), data)
 
     def get_maps(self) -> Optional[List[dict]]:
         request = 'api/v1/maps'
         res: requests.Response = self.get(request)
-        self.validate_response(res)
-        res_json: List[dict] = res.json()
-
-        CppServer.assert_type('Map list', list, res_json)
-
-        for m in res_json:
-            CppServer.assert_fields('Map', ['id', 'name'], m.keys())
-            CppServer.assert_type('Map id', str, m['id'])
-            CppServer.assert_type('Map name', str, m['name'])
-
+        res_json: List[dict] = self.validate_response(res, self.decoder)
+        CppServer.validate_maps(res_json)
         return res_json
 
     def get_map(self, map_id: str) -> Optional[dict]:
         request = 'api/v1/maps/' + map_id
         res: requests.Response = self.get(request)
-        self.validate_response(res)
-        self.validate_map(res.json())
-        return res.json()
+        res_json: dict = self.validate_response(res, self.decoder)
+        self.validate_map(res_json)
+        return res_json
+
+    def stream_map(self, map_id: str) -> Iterator[Tuple[str, Union[str, int, None], Any]]:
+        """
+        Streaming counterpart of `get_map`: the body is validated while it arrives, and the fields are yielded
+        as `stream_object` does, e.g. ('roads', None, []) and then ('roads', 0, road).
+        The first error is raised once its item is read
+        """
+        request = 'api/v1/maps/' + map_id
+        res = self.request('GET', None, request, stream=True)
+        yield from CppServer.stream_response(res, MAP_SCHEMA)
 
     def join(self, player_name: str, map_id: str) -> Tuple[str, int]:
         request = 'api/v1/game/join'
         header = {'content-type': 'application/json'}
         data = {"userName": player_name, "mapId": map_id}
         res = self.request('POST', header, request, json=data)
-        res_json: dict = res.json()
+        res_json: dict = self.decode(res, self.decoder)
 
         CppServer.assert_fields('Join game response', ['authToken', 'playerId'], res_json.keys())
 
@@ -207,11 +636,32 @@ class CppServer:
                   'Authorization': f'Bearer {token}'}
 
         res = self.request('GET', header, request)
-        self.validate_response(res)
-        res_json = res.json()
+        res_json = self.validate_response(res, self.decoder)
         self.validate_state(res_json)
         return res_json
 
+    def stream_state(self, token: str) -> Iterator[Tuple[str, Union[str, int, None], Any]]:
+        """
+        Streaming counterpart of `get_state`, yields ('players', None, {}) and then ('players', player_id, player)
+        for every player
+        """
+        request = '/api/v1/game/state'
+        header = {'content-type': 'application/json',
+                  'Authorization': f'Bearer {token}'}
+
+        res = self.request('GET', header, request, stream=True)
+        yield from CppServer.stream_response(res, STATE_SCHEMA)
+
+    def get_state_delta(self, token: str, since: int) -> Optional[dict]:
+        request = f'/api/v1/game/state/delta?since={since}'
+        header = {'content-type': 'application/json',
+                  'Authorization': f'Bearer {token}'}
+
+        res = self.request('GET', header, request)
+        res_json = self.validate_response(res, self.decoder)
+        self.validate_state_delta(res_json)
+        return res_json
+
     def get_player_state(self, token: str, player_id: int) -> Optional[dict]:
         game_session_state = self.get_state(token)
 
@@ -236,14 +686,14 @@ class CppServer:
         header = {'content-type': 'application/json', 'Authorization': f'Bearer {token}'}
         data = {"move": direction}
         res = self.request('POST', header, request, json=data)
-        self.validate_response(res)
+        self.validate_response(res, self.decoder)
 
     def tick(self, ticks: int):
         request = 'api/v1/game/tick'
         header = {'content-type': 'application/json'}
         data = {"timeDelta": ticks}
         res = self.request('POST', header, request, json=data)
-        self.validate_response(res)
+        self.validate_response(res, self.decoder)
 
     @staticmethod
     def assert_type(obj_name: str, expected_types: Union[Type, List[Type]], obj: any):
@@ -263,9 +713,38 @@ class CppServer:
             if key not in given_keys:
                 raise WrongFields(object_name, list(expected_keys), list(given_keys))
 
+    @staticmethod
+    def decode(res: requests.Response, decoder: Callable[[bytes], Any] = DEFAULT_DECODER) -> Any:
+        content = res.content
+        try:
+            return decoder(content)
+        except json.decoder.JSONDecodeError as je:
+            raise DataInconsistency('The response has badly encoded JSON',
+                                    {'response content': content, 'JSON decoder error': [je.msg, je.doc, je.pos]})
+        except ValueError as ex:
+            raise DataInconsistency('The response has badly encoded JSON',
+                                    {'response content': content, 'JSON decoder error': str(ex)})
+
     # Wil be rewritten soon
     @staticmethod
-    def validate_response(res: requests.Response):
+    def validate_response(res: requests.Response, decoder: Callable[[bytes], Any] = DEFAULT_DECODER) -> Any:
+        """
+        Checks the status and the headers, and returns the body, which is decoded only here
+        """
+        CppServer.validate_headers(res)
+
+        if res.request.method != 'HEAD':
+            if int(res.headers['content-length']) != len(res.content):
+                raise UnexpectedData('Headers\' content-length', len(res.content), int(res.headers['content-length']))
+        else:
+            if res.headers['content-length'] != 0:
+                raise UnexpectedData('Headers\' content-length for head request should be zero',
+                                     0, int(res.headers['content-length']))
+
+        return CppServer.decode(res, decoder)
+
+    @staticmethod
+    def validate_headers(res: requests.Response):
         if res.status_code != 200:
             raise BadRequest('Status code isn\'t OK', {'status code': res.status_code, 'response': res.content})
 
@@ -279,108 +758,123 @@ class CppServer:
         if res.headers['cache-control'] != 'no-cache':
             raise UnexpectedData('Cache-control', 'no-cache', res.headers['cache-control'])
 
-        if res.request.method != 'HEAD':
-            if int(res.headers['content-length']) != len(res.content):
-                raise UnexpectedData('Headers\' content-length', len(res.content), int(res.headers['content-length']))
-        else:
-            if res.headers['content-length'] != 0:
-                raise UnexpectedData('Headers\' content-length for head request should be zero',
-                                     0, int(res.headers['content-length']))
-
+    @staticmethod
+    def stream_response(res: requests.Response, schema: Object) -> Iterator[Tuple[str, Union[str, int, None], Any]]:
+        """
+        Checks the status and the headers, then validates the body with `stream_object` chunk by chunk.
+        The content-length is compared once the whole body is read
+        """
         try:
-            res.json()
-        except json.decoder.JSONDecodeError as je:
-            raise DataInconsistency('The response has badly encoded JSON',
-                                    {'response content': res.content, 'JSON decoder error': [je.msg, je.doc, je.pos]})
+            CppServer.validate_headers(res)
+
+            stream = JsonStream(res.iter_content(STREAM_CHUNK_SIZE))
+            try:
+                yield from stream_object(stream, schema)
+                stream.finish()
+            except json.decoder.JSONDecodeError as je:
+                raise DataInconsistency('The response has badly encoded JSON',
+                                        {'response content': je.doc[max(je.pos - 64, 0):je.pos + 64],
+                                         'JSON decoder error': [je.msg, stream.offset + je.pos]})
+
+            if int(res.headers['content-length']) != stream.size:
+                raise UnexpectedData('Headers\' content-length', stream.size, int(res.headers['content-length']))
+        finally:
+            res.close()
+
+    validate_maps = staticmethod(compile_validator(MAP_LIST_SCHEMA, 'validate_maps'))
+    validate_map = staticmethod(compile_validator(MAP_SCHEMA, 'validate_map'))
 
     @staticmethod
-    def validate_map(m: dict):
-        expected = {'id': str, 'name': str, 'roads': list, 'buildings': list, 'offices': list}
+    def validate_token(token: str):
+        try:
+            int(token, 16)
+        except ValueError:
+            raise DataInconsistency('Token is invalid, it should be a hex value', {'token': token})
 
-        CppServer.assert_fields('Map', expected.keys(), m.keys())
+    validate_state = staticmethod(compile_validator(STATE_SCHEMA, 'validate_state'))
+    validate_state_delta = staticmethod(compile_validator(STATE_DELTA_SCHEMA, 'validate_state_delta'))
+    validate_player_state = staticmethod(compile_validator(PLAYER_STATE_SCHEMA, 'validate_player_state'))
 
-        for key in expected.keys():
-            CppServer.assert_type(key, expected[key], m[key])
 
-        extra = {'dogSpeed': float}
+class StateMirror:
+    """
+    Local copy of a session state, patched with the deltas since its version instead of downloading
+    the whole state on every poll. `fetch_delta(since)` is e.g. a bound `CppServer.get_state_delta` with
+    the token of a player, or the same method of the reference GameServer:
 
-        for key in extra:
-            if key in m.keys():
-                CppServer.assert_type(key, extra[key], m[key])
+        mirror = StateMirror(functools.partial(server.get_state_delta, token))
+        state = mirror.update()
+    """
 
-        dog_speed = m.get('dogSpeed')
-        if dog_speed is not None:
-            if dog_speed < 0:
-                raise DataInconsistency('Dog speed can\'t be negative', {'dog speed': dog_speed})
+    def __init__(self, fetch_delta: Callable[[int], dict]):
+        self.fetch_delta = fetch_delta
+        self.version = 0
+        self.players: dict = dict()
+        self.lost_objects: dict = dict()
 
-        for road in m['roads']:
-            road: dict
-            CppServer.assert_type('Road', dict, road)
+    def get_state(self) -> dict:
+        return {'players': self.players, 'lostObjects': self.lost_objects}
 
-            if road.keys() != {'x0', 'y0', 'x1'} and road.keys() != {'x0', 'y0', 'y1'}:
-                raise WrongFields('Road', '["x0", "y0", "x1"] or ["x0", "y0", "y1"]', list(road.keys()))
+    def apply(self, delta: dict):
+        if delta['full']:
+            self.players = dict(delta['players'])
+        else:
+            for player_id in delta['removed']:
+                self.players.pop(player_id, None)
+            self.players.update(delta['players'])
 
-            for coordinate in road:
-                CppServer.assert_type(f'Road coordinate {coordinate}', [float, int], road[coordinate])
+        if 'lostObjects' in delta:
+            self.lost_objects = delta['lostObjects']
+        self.version = delta['version']
 
-        for building in m['buildings']:
-            building: dict
+    def update(self) -> dict:
+        self.apply(self.fetch_delta(self.version))
+        return self.get_state()
 
-            CppServer.assert_type('Building on the map', dict, building)
-            CppServer.assert_fields('Building on the map', ['x', 'y', 'w', 'h'], building.keys())
 
-            for field in building:
-                CppServer.assert_type(f'Building field {field}', [float, int], building[field])
-                if field in ['w', 'h']:
-                    if building[field] <= 0:
-                        raise DataInconsistency('Building size is\'t positive', {'building': building})
+class AsyncCppServer:
+    """
+    Asyncio counterpart of CppServer. The calls are made by the wrapped CppServer in a thread pool,
+    so the validation and the exceptions are the same, and at most `limit` requests are in flight at once
+    """
 
-        for office in m['offices']:
-            office: dict
-            CppServer.assert_type('Office', dict, office)
+    def __init__(self, server: CppServer, limit: int = 10):
+        self.server = server
+        self.executor = ThreadPoolExecutor(max_workers=limit)
 
-            expected = {'id': str, 'x': [float, int], 'y': [float, int],
-                        'offsetX': [float, int], 'offsetY': [float, int]}
+    async def __aenter__(self):
+        return self
 
-            CppServer.assert_fields('Office on the map', expected.keys(), office.keys())
+    async def __aexit__(self, *exc_info):
+        self.close()
 
-            for field in expected:
-                CppServer.assert_type(f'Office field {field}', expected[field], office[field])
+    def close(self):
+        self.executor.shutdown()
 
-    @staticmethod
-    def validate_token(token: str):
-        try:
-            int(token, 16)
-        except ValueError:
-            raise DataInconsistency('Token is invalid, it should be a hex value', {'token': token})
+    async def call(self, method: Callable, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(method, *args))
 
-    @staticmethod
-    def validate_state(res_json: dict):
-        CppServer.assert_type('Game state', dict, res_json)
-        players = res_json.get('players')
-        CppServer.assert_type('Game state, players', dict, players)
-        for player_id in players:
-            CppServer.assert_type('Player id', [str, int], player_id)
-            player: dict = players[player_id]
+    async def get_maps(self) -> Optional[List[dict]]:
+        return await self.call(self.server.get_maps)
 
-            CppServer.validate_player_state(player)
+    async def get_map(self, map_id: str) -> Optional[dict]:
+        return await self.call(self.server.get_map, map_id)
 
-    @staticmethod
-    def validate_player_state(state: dict):
+    async def join(self, player_name: str, map_id: str) -> Tuple[str, int]:
+        return await self.call(self.server.join, player_name, map_id)
+
+    async def get_state(self, token: str) -> Optional[dict]:
+        return await self.call(self.server.get_state, token)
 
-        CppServer.assert_type('player_id', dict, state)
+    async def get_state_delta(self, token: str, since: int) -> Optional[dict]:
+        return await self.call(self.server.get_state_delta, token, since)
 
-        expected = {'pos': list, 'speed': list, 'dir': str}
-        for key in expected:
-            CppServer.assert_fields(f'Player state', expected.keys(), state.keys())
-            CppServer.assert_type(key, expected[key], state[key])
+    async def get_player_state(self, token: str, player_id: int) -> Optional[dict]:
+        return await self.call(self.server.get_player_state, token, player_id)
 
-        for coordinate in state['pos']:
-            CppServer.assert_type('Player position', float, coordinate)
-        for coordinate in state['speed']:
-            CppServer.assert_type('Player speed', float, coordinate)
+    async def move(self, token: str, direction: str):
+        return await self.call(self.server.move, token, direction)
 
-        CppServer.assert_type('Player direction', str, state['dir'])
-        expected_dirs = ['R', 'L', 'U', 'D', '']
-        if state['dir'] not in expected_dirs:
-            raise UnexpectedData('Player direction', ['R', 'L', 'U', 'D', ''], state['dir'])
+    async def tick(self, ticks: int):
+        return await self.call(self.server.tick, ticks)
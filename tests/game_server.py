@@ -1,15 +1,34 @@
 from __future__ import annotations
 
+import os
 import json
+import heapq
+import bisect
 import logging
 import math
 import random
+import sys
 
-from typing import List, Optional
-from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Type, Union
+from collections import OrderedDict, defaultdict
+from itertools import accumulate
+
+from dataclasses import dataclass, field
 from pathlib import Path
 from enum import Enum
 
+from leaderboard import Leaderboard
+
+# Slotted dataclasses with default values are supported since Python 3.10
+SLOTTED = {'slots': True} if sys.version_info >= (3, 10) else {}
+
+DEFAULT_BAG_CAPACITY = 3
+
+# Half widths: a dog collects an item or reaches an office when their centers are closer than the sum
+GATHERER_WIDTH = 0.3
+LOOT_WIDTH = 0.0
+OFFICE_WIDTH = 0.25
+
 
 class Direction(Enum):
     U = 1
@@ -31,6 +50,8 @@ class Direction(Enum):
 
 @dataclass
 class Point:
+    __slots__ = ('x', 'y')
+
     x: float
     y: float
 
@@ -65,6 +86,7 @@ class Point:
 
 
 class Vector2D(Point):
+    __slots__ = ()
 
     def __mul__(self, other: float) -> Vector2D:
         x = self.x * other
@@ -97,15 +119,251 @@ class Road:
         return Point(new_x, new_y)
 
 
-@dataclass
+class RoadIndex:
+    """
+    Uniform grid over the road bounding boxes. Every road is registered in each cell its box overlaps,
+    so a point lookup checks only the roads of a single cell instead of the whole map
+    """
+
+    def __init__(self, roads: List[Road], cell_size: Optional[float] = None):
+        self.roads = roads
+        self.cell_size = cell_size if cell_size is not None else RoadIndex.estimate_cell_size(roads)
+        self.cells: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+
+        # Road indices are appended in the map order, so every cell keeps them sorted
+        for index, road in enumerate(roads):
+            for cell in self.cells_of(road.left_bottom_corner, road.right_top_corner):
+                self.cells[cell].append(index)
+
+    @staticmethod
+    def estimate_cell_size(roads: List[Road]) -> float:
+        # The mean road box side keeps both the cell count per road and the road count per cell small
+        if len(roads) == 0:
+            return 1.0
+        total = 0.0
+        for road in roads:
+            total += max(road.right_top_corner.x - road.left_bottom_corner.x,
+                         road.right_top_corner.y - road.left_bottom_corner.y)
+        return max(total / len(roads), 1.0)
+
+    def cell_of(self, point: Point) -> Tuple[int, int]:
+        return math.floor(point.x / self.cell_size), math.floor(point.y / self.cell_size)
+
+    def cells_of(self, left_bottom: Point, right_top: Point) -> Iterator[Tuple[int, int]]:
+        x0, y0 = self.cell_of(left_bottom)
+        x1, y1 = self.cell_of(right_top)
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                yield x, y
+
+    def get_roads(self, point: Point) -> List[Road]:
+        """
+        Roads containing the point, in the same order as in the map
+        """
+        candidates = self.cells.get(self.cell_of(point), [])
+        return [self.roads[i] for i in candidates if self.roads[i].is_on_the_road(point)]
+
+    def is_on_roads(self, point: Point) -> bool:
+        candidates = self.cells.get(self.cell_of(point), [])
+        return any(self.roads[i].is_on_the_road(point) for i in candidates)
+
+
+class RoadSampler:
+    """
+    Uniform random points on the road axes. A road is chosen with the probability proportional to its length
+    by a binary search in the cumulative length table, so a sample costs O(log n) for n roads
+    """
+
+    def __init__(self, raw_roads: List[dict]):
+        self.segments: List[Tuple[float, float, float, float]] = list()
+        lengths: List[float] = list()
+        for r in raw_roads:
+            x0, y0 = r['x0'], r['y0']
+            x1 = r.get('x1', x0)
+            y1 = r.get('y1', y0)
+            self.segments.append((x0, y0, x1, y1))
+            lengths.append(abs(x1 - x0) + abs(y1 - y0))
+        self.cumulative_lengths: List[float] = list(accumulate(lengths))
+
+    def sample(self, rng: random.Random) -> Point:
+        total = self.cumulative_lengths[-1]
+        if total == 0:
+            # Only single-point roads, every one of them is equally likely
+            x0, y0, _, _ = rng.choice(self.segments)
+            return Point(float(x0), float(y0))
+
+        offset = rng.uniform(0.0, total)
+        index = min(bisect.bisect_right(self.cumulative_lengths, offset), len(self.segments) - 1)
+        x0, y0, x1, y1 = self.segments[index]
+        road_start = self.cumulative_lengths[index - 1] if index > 0 else 0.0
+        length = self.cumulative_lengths[index] - road_start
+        fraction = bound(0.0, 1.0, (offset - road_start) / length) if length > 0 else 0.0
+        return Point(x0 + (x1 - x0) * fraction, y0 + (y1 - y0) * fraction)
+
+
+class LootGenerator:
+    """
+    The same algorithm as the loot generator of the C++ server: the chance to spawn grows with the time
+    without loot, and at most one item per looter is kept on the map
+    """
+
+    def __init__(self, period: float, probability: float, random_generator: Callable[[], float] = lambda: 1.0):
+        self.period = period    # seconds
+        self.probability = probability
+        self.random_generator = random_generator
+        self.time_without_loot = 0.0
+
+    def generate(self, ticks: int, loot_count: int, looter_count: int) -> int:
+        self.time_without_loot += ticks / 1000
+        loot_shortage = max(looter_count - loot_count, 0)
+        ratio = self.time_without_loot / self.period
+        probability = bound(0.0, 1.0, (1.0 - (1.0 - self.probability) ** ratio) * self.random_generator())
+
+        # std::round, i.e. halves are rounded away from zero
+        generated_loot = math.floor(loot_shortage * probability + 0.5)
+        if generated_loot > 0:
+            self.time_without_loot = 0.0
+        return generated_loot
+
+
+@dataclass(frozen=True, eq=False)
+class CompiledMap:
+    """
+    Data derived from a map once and shared by every session, fixture and check on it.
+    Compiled maps are hashed by identity, so they can key caches of other derived data
+    """
+
+    id: str
+    raw: dict
+    roads: Tuple[Road, ...]
+    road_index: RoadIndex
+    road_sampler: RoadSampler
+    # Bounding box of all the roads
+    left_bottom: Point
+    right_top: Point
+    dog_speed: Optional[float]
+    bag_capacity: Optional[int]
+    loot_values: Tuple[int, ...]
+    office_positions: Tuple[Tuple[float, float], ...]
+
+
+def build_compiled_map(game_map: dict) -> CompiledMap:
+    roads = tuple(Road(r) for r in game_map['roads'])
+    left_bottom = Point(min((road.left_bottom_corner.x for road in roads), default=0.0),
+                        min((road.left_bottom_corner.y for road in roads), default=0.0))
+    right_top = Point(max((road.right_top_corner.x for road in roads), default=0.0),
+                      max((road.right_top_corner.y for road in roads), default=0.0))
+
+    return CompiledMap(
+        id=game_map['id'],
+        raw=game_map,
+        roads=roads,
+        road_index=RoadIndex(list(roads)),
+        road_sampler=RoadSampler(game_map['roads']),
+        left_bottom=left_bottom,
+        right_top=right_top,
+        dog_speed=game_map.get('dogSpeed'),
+        bag_capacity=game_map.get('bagCapacity'),
+        loot_values=tuple(loot_type.get('value', 0) for loot_type in game_map.get('lootTypes', [])),
+        office_positions=tuple((office['x'], office['y']) for office in game_map.get('offices', [])),
+    )
+
+
+# Maps compiled in this process, the least recently used first: id of the raw map -> (raw map, compiled map).
+# The raw map is kept, so its id isn't reused while the entry lives. Reloaded configs give new raw maps,
+# so the cache is bounded rather than growing with every reload
+COMPILED_MAPS_CACHE_SIZE = 256
+_compiled_maps: OrderedDict[int, Tuple[dict, CompiledMap]] = OrderedDict()
+
+
+def compile_map(game_map: dict) -> CompiledMap:
+    """
+    Compiled map, built once per raw map object. Maps of a catalog are shared and never modified, and a reloaded
+    config gives new objects, so any other map with the same id is compiled again rather than compared
+    """
+    cached = _compiled_maps.get(id(game_map))
+    if cached is not None:
+        _compiled_maps.move_to_end(id(game_map))
+        return cached[1]
+
+    compiled_map = build_compiled_map(game_map)
+    _compiled_maps[id(game_map)] = game_map, compiled_map
+    if len(_compiled_maps) > COMPILED_MAPS_CACHE_SIZE:
+        _compiled_maps.popitem(last=False)
+    return compiled_map
+
+
+def get_road_index(game_map: dict) -> RoadIndex:
+    return compile_map(game_map).road_index
+
+
+def is_point_on_roads(game_map: dict, point: Point) -> bool:
+    return get_road_index(game_map).is_on_roads(point)
+
+
+class MapCatalog:
+    """
+    Config parsed once per process. Maps are compiled on the first request
+    """
+
+    def __init__(self, config: dict):
+        self.config = config
+        self.maps: Optional[Dict[str, dict]] = dict()
+        try:
+            for m in config['maps']:
+                self.maps.setdefault(m['id'], m)
+        except KeyError:
+            self.maps = None
+
+    def get_map(self, map_id: str) -> Optional[dict]:
+        return self.maps.get(map_id) if self.maps is not None else None
+
+    def get_compiled_map(self, map_id: str) -> Optional[CompiledMap]:
+        game_map = self.get_map(map_id)
+        return compile_map(game_map) if game_map is not None else None
+
+
+# Catalogs by the config path, with the modification time they were read at
+_catalogs: Dict[Path, Tuple[int, MapCatalog]] = dict()
+
+
+def load_catalog(config_file_name: Path) -> MapCatalog:
+    """
+    Catalog of the config file, it's parsed again only if the file has changed.
+    The catalog is shared, so the config and the maps must not be modified
+    """
+    path = Path(config_file_name).resolve()
+    try:
+        modified = os.stat(path).st_mtime_ns
+        cached = _catalogs.get(path)
+        if cached is not None and cached[0] == modified:
+            return cached[1]
+
+        with open(path) as f:
+            catalog = MapCatalog(json.load(f))
+    except FileNotFoundError:
+        logging.error("Config file is not found. Check the file location: %s", config_file_name)
+        raise
+
+    except json.decoder.JSONDecodeError as ex:
+        logging.error("Unable to load json config. Error: %s", ex.args[0])
+        raise
+
+    _catalogs[path] = modified, catalog
+    return catalog
+
+
+@dataclass(**SLOTTED)
 class Player:
 
     name: str
     token: str
     id: int
     position: Point
-    speed: Vector2D = Vector2D(0.0, 0.0)
+    speed: Vector2D = field(default_factory=lambda: Vector2D(0.0, 0.0))
     direction: Direction = Direction.U
+    bag: List[LostObject] = field(default_factory=list)
+    score: int = 0
 
     def set_speed(self, direction: str, speed: float):
         self.speed = get_speed(direction, speed)
@@ -122,7 +380,9 @@ class Player:
         state = {
             'pos': self.position.to_list(),
             'speed': self.speed.to_list(),
-            'dir': str(self.direction)
+            'dir': str(self.direction),
+            'bag': [lost_object.get_bag_state() for lost_object in self.bag],
+            'score': self.score
         }
         return state
 
@@ -131,48 +391,360 @@ class Player:
         return new_position
 
 
+@dataclass(**SLOTTED)
+class LostObject:
+
+    id: int
+    type: int
+    position: Point
+
+    def get_state(self) -> dict:
+        return {'type': self.type, 'pos': self.position.to_list()}
+
+    def get_bag_state(self) -> dict:
+        return {'id': self.id, 'type': self.type}
+
+
 class GameSession:
 
-    def __init__(self, game_map: dict, default_speed):
+    def __init__(self, game_map: dict, default_speed, loot_generator: Optional[LootGenerator] = None,
+                 seed: Optional[Union[int, str]] = None, default_bag_capacity: int = DEFAULT_BAG_CAPACITY,
+                 retirement_time: Optional[float] = None):
         self.map = game_map
-        self.roads: List[Road] = list()
-        for r in game_map['roads']:
-            road = Road(r)
-            self.roads.append(road)
+        self.compiled_map = compile_map(game_map)
+        self.road_index = self.compiled_map.road_index
+        self.roads: List[Road] = self.road_index.roads
 
         self.players: List[Player] = list()
-
-        self.default_speed = game_map.get('dogSpeed', default_speed)
+        self.players_by_token: Dict[str, Player] = dict()
+        # Serialized states of the players by id, in the players order. Only the states of the changed players
+        # are serialized again on a read, and the lost objects state is kept until they change.
+        # Joined and loaded players are changed ones too, so their states are built on the first read.
+        # The players state is copied on write once it has been handed out, so a read state never changes
+        self.players_state: Dict[str, dict] = dict()
+        self.players_state_shared = False
+        # Tokens in the order they changed, so the joined players come into the state in order
+        self.changed_players: Dict[str, None] = dict()
+        self.lost_objects_state: Optional[dict] = None
+        # Every read stamps the changes made since the previous one with a new state version.
+        # Versions of the players by id are kept in the stamping order, removed players included.
+        # Players changed since the last stamp are kept in the order they changed, so joined ones come in order
+        self.state_version = 0
+        self.player_versions: Dict[str, int] = dict()
+        self.unversioned_players: Dict[str, None] = dict()
+        self.lost_objects_version = 0
+
+        dog_speed = self.compiled_map.dog_speed
+        self.default_speed = dog_speed if dog_speed is not None else default_speed
+
+        self.loot_types: List[dict] = game_map.get('lootTypes', [])
+        self.loot_generator = loot_generator if len(self.loot_types) != 0 and len(self.roads) != 0 else None
+        self.road_sampler = self.compiled_map.road_sampler
+        self.lost_objects: Dict[int, LostObject] = dict()
+        self.next_loot_id = 0
+        self.random = random.Random(seed)
+
+        bag_capacity = self.compiled_map.bag_capacity
+        self.bag_capacity: int = bag_capacity if bag_capacity is not None else default_bag_capacity
+        self.office_positions: List[List[float]] = [list(position) for position in self.compiled_map.office_positions]
+
+        # Game clock and the retirement time are in milliseconds, like the ticks
+        self.time = 0
+        self.retirement_time: Optional[float] = retirement_time * 1000 if retirement_time is not None else None
+        self.join_times: Dict[str, int] = dict()
+        self.idle_since: Dict[str, int] = dict()
+        # Min-heap of (deadline, token). An entry is stale once the player has moved since it was pushed
+        self.retirement_deadlines: List[Tuple[float, str]] = list()
 
     def add_player(self, name: str, token: str, _id: int, position: Point):
-        player = Player(name, token, _id, position)
+        # The player owns its position, since it may be updated in place. The coordinates are floats, as after a tick
+        player = Player(name, token, _id, Point(float(position.x), float(position.y)))
         self.players.append(player)
+        self.players_by_token[token] = player
+        self.changed_players[token] = None
+        self.join_times[token] = self.time
+        self.set_idle(token, True, self.time)
+
+    def has_player(self, token: str) -> bool:
+        return token in self.players_by_token
+
+    def move(self, token: str, direction: str) -> bool:
+        player = self.players_by_token.get(token)
+        if player is None:
+            return False
+        player.set_speed(direction, self.default_speed)
+        self.changed_players[token] = None
+        return True
 
     def get_state(self) -> Optional[dict]:
-        state = dict()
-        for player in self.players:
-            player_state = {
-                str(player.id): player.get_state()
-            }
-            state.update(player_state)
+        """
+        The state shares the serialized players and lost objects with the session and the other reads,
+        so it must not be changed
+        """
+        self.refresh_state()
+        self.players_state_shared = True
+        return {'players': self.players_state, 'lostObjects': self.lost_objects_state}
+
+    def get_state_delta(self, since: int) -> dict:
+        """
+        Changes of the state after the version `since`: states of the players changed or joined since then,
+        ids of the players removed since then, and the lost objects if they changed. A delta since 0,
+        or since a version the session hasn't reached, is `full`: it holds the whole state, which replaces
+        the one of the reader. The delta shares the serialized states with the session, like `get_state`
+        """
+        self.refresh_state()
+        if since <= 0 or since > self.state_version:
+            self.players_state_shared = True
+            return {'version': self.state_version, 'full': True, 'players': self.players_state, 'removed': [],
+                    'lostObjects': self.lost_objects_state}
+
+        # Only the players stamped after `since` are visited, from the end of the stamping order
+        changed: List[str] = list()
+        for player_id, version in reversed(self.player_versions.items()):
+            if version <= since:
+                break
+            changed.append(player_id)
+        changed.reverse()
+
+        delta = {
+            'version': self.state_version,
+            'full': False,
+            'players': {player_id: self.players_state[player_id]
+                        for player_id in changed if player_id in self.players_state},
+            'removed': [player_id for player_id in changed if player_id not in self.players_state],
+        }
+        if self.lost_objects_version > since:
+            delta['lostObjects'] = self.lost_objects_state
+        return delta
+
+    def refresh_state(self):
+        """
+        Serializes the players changed since the previous read, and stamps the changes with a new state version
+        """
+        if len(self.changed_players) != 0:
+            self.put_players_state(self.serialize_players(self.changed_players))
+            self.changed_players.clear()
+
+        lost_objects_changed = self.lost_objects_state is None
+        if lost_objects_changed:
+            self.lost_objects_state = self.get_lost_objects_state()
+        if len(self.unversioned_players) == 0 and not lost_objects_changed:
+            return
+
+        self.state_version += 1
+        for player_id in self.unversioned_players:
+            # Moved to the end, so the versions stay in the stamping order
+            self.player_versions.pop(player_id, None)
+            self.player_versions[player_id] = self.state_version
+        self.unversioned_players.clear()
+        if lost_objects_changed:
+            self.lost_objects_version = self.state_version
+
+    def serialize_players(self, tokens: Iterable[str]) -> Dict[str, dict]:
+        players = [self.players_by_token[token] for token in tokens]
+        return {str(player.id): player.get_state() for player in players}
+
+    def get_writable_players_state(self) -> Dict[str, dict]:
+        if self.players_state_shared:
+            self.players_state = dict(self.players_state)
+            self.players_state_shared = False
+        return self.players_state
+
+    def put_players_state(self, players_state: Dict[str, dict]):
+        self.get_writable_players_state().update(players_state)
+        self.unversioned_players.update(dict.fromkeys(players_state))
+
+    def drop_player_state(self, player_id: str):
+        # A player removed before any read has no state yet
+        self.get_writable_players_state().pop(player_id, None)
+        self.unversioned_players[player_id] = None
+
+    def mark_changed(self, index: int):
+        self.changed_players[self.players[index].token] = None
+
+    def get_lost_objects_state(self) -> dict:
+        return {str(loot_id): lost_object.get_state() for loot_id, lost_object in self.lost_objects.items()}
+
+    def add_lost_object(self, loot_type: int, position: Point, loot_id: Optional[int] = None) -> LostObject:
+        if loot_id is None:
+            loot_id = self.next_loot_id
+        lost_object = LostObject(loot_id, loot_type, Point(position.x, position.y))
+        self.lost_objects[lost_object.id] = lost_object
+        self.lost_objects_state = None
+        self.next_loot_id = max(self.next_loot_id, loot_id + 1)
+        return lost_object
+
+    def set_lost_objects(self, lost_objects: dict):
+        """
+        Replaces the lost objects with the given `lostObjects` state, e.g. the one spawned by the C++ server
+        """
+        self.lost_objects.clear()
+        self.lost_objects_state = None
+        for loot_id, lost_object in lost_objects.items():
+            self.add_lost_object(lost_object['type'], Point(*lost_object['pos']), int(loot_id))
+
+    def get_loot_value(self, loot_type: int) -> int:
+        return self.compiled_map.loot_values[loot_type]
+
+    def get_bag(self, index: int) -> List[LostObject]:
+        return self.players[index].bag
+
+    def add_score(self, index: int, points: int):
+        self.players[index].score += points
+
+    def gather(self, starts: list, ends: list):
+        """
+        Picks up the lost objects and returns the bags to the offices met by the players moving
+        from `starts` to `ends`, (n, 2) coordinates in the players order. Segments of all players are
+        checked in one batch, and the events are handled in the order of time
+        """
+        if len(self.lost_objects) == 0 and len(self.office_positions) == 0:
+            return
+
+        # collision_detector imports this module, so it can't be imported at the top
+        from collision_detector import find_gather_events_arrays
+
+        lost_objects = list(self.lost_objects.values())
+        item_positions = [lost_object.position.to_list() for lost_object in lost_objects] + self.office_positions
+        item_widths = [LOOT_WIDTH] * len(lost_objects) + [OFFICE_WIDTH] * len(self.office_positions)
+        events = find_gather_events_arrays(item_positions, item_widths, starts, ends,
+                                           [GATHERER_WIDTH] * len(starts))
+
+        for item, gatherer in zip(events['item_id'].tolist(), events['gatherer_id'].tolist()):
+            bag = self.get_bag(gatherer)
+            if item >= len(lost_objects):
+                # An office: the whole bag is handed over
+                if len(bag) != 0:
+                    self.add_score(gatherer, sum(self.get_loot_value(lost_object.type) for lost_object in bag))
+                    bag.clear()
+                    self.mark_changed(gatherer)
+                continue
+
+            lost_object = lost_objects[item]
+            if lost_object.id in self.lost_objects and len(bag) < self.bag_capacity:
+                bag.append(lost_object)
+                del self.lost_objects[lost_object.id]
+                self.lost_objects_state = None
+                self.mark_changed(gatherer)
+
+    def spawn_loot(self, ticks: int, looter_count: int):
+        if self.loot_generator is None:
+            return
+
+        count = self.loot_generator.generate(ticks, len(self.lost_objects), looter_count)
+        for _ in range(count):
+            loot_type = self.random.randrange(len(self.loot_types))
+            self.add_lost_object(loot_type, self.road_sampler.sample(self.random))
+
+    def set_idle(self, token: str, idle: bool, since: int):
+        """
+        Starts or stops counting the idle time of the player. Only a start pushes a deadline to the heap,
+        a stop leaves the entry to be skipped as stale when it's popped
+        """
+        if not idle:
+            self.idle_since.pop(token, None)
+            return
+        if token in self.idle_since:
+            return
+
+        self.idle_since[token] = since
+        if self.retirement_time is not None:
+            heapq.heappush(self.retirement_deadlines, (since + self.retirement_time, token))
+
+    def retire_expired(self) -> Dict[str, dict]:
+        """
+        Removes the players idle for the retirement time by now and returns their records by token.
+        Pops only the expired heap entries, so it costs O(k log n) for k entries
+        """
+        retired: List[str] = list()
+        while len(self.retirement_deadlines) != 0 and self.retirement_deadlines[0][0] <= self.time:
+            deadline, token = heapq.heappop(self.retirement_deadlines)
+            since = self.idle_since.get(token)
+            if since is not None and since + self.retirement_time == deadline:
+                retired.append(token)
+
+        if len(retired) == 0:
+            return dict()
+        return self.remove_players(retired)
+
+    def make_record(self, token: str, name: str, score: int) -> dict:
+        self.idle_since.pop(token, None)
+        play_time = (self.time - self.join_times.pop(token)) / 1000
+        return {'name': name, 'score': score, 'playTime': play_time}
+
+    def remove_players(self, tokens: List[str]) -> Dict[str, dict]:
+        records = dict()
+        for token in tokens:
+            player = self.players_by_token.pop(token)
+            self.drop_player_state(str(player.id))
+            self.changed_players.pop(token, None)
+            records[token] = self.make_record(token, player.name, player.score)
+        self.players = [player for player in self.players if player.token in self.players_by_token]
+        return records
+
+    def dump_players(self) -> dict:
+        """
+        Players as columns in the players order, bags as lists of (id, type) pairs
+        """
+        return {
+            'id': [player.id for player in self.players],
+            'token': [player.token for player in self.players],
+            'name': [player.name for player in self.players],
+            'position': [player.position.to_list() for player in self.players],
+            'speed': [player.speed.to_list() for player in self.players],
+            'direction': [player.direction.value for player in self.players],
+            'score': [player.score for player in self.players],
+            'bag': [[(lost_object.id, lost_object.type) for lost_object in player.bag] for player in self.players],
+        }
 
-        return {'players': state}
+    def load_players(self, players: dict):
+        """
+        Adds the players given as `dump_players` columns, list-like or NumPy arrays.
+        Their join and idle times have to be restored by `restore_clock` beforehand
+        """
+        columns = [players[key] for key in ('id', 'token', 'name', 'position', 'speed', 'direction', 'score', 'bag')]
+        columns = [column.tolist() if hasattr(column, 'tolist') else column for column in columns]
+        for _id, token, name, position, speed, direction, score, bag in zip(*columns):
+            player = Player(name, token, _id, Point(*position), Vector2D(*speed), Direction(direction),
+                            [LostObject(loot_id, loot_type, Point(0.0, 0.0)) for loot_id, loot_type in bag], score)
+            self.players.append(player)
+            self.players_by_token[token] = player
+            self.changed_players[token] = None
+
+    def restore_clock(self, time: int, join_times: Dict[str, int], idle_since: Dict[str, int]):
+        self.time = time
+        self.join_times = join_times
+        self.idle_since = idle_since
+        self.retirement_deadlines = list()
+        if self.retirement_time is not None:
+            self.retirement_deadlines = [(since + self.retirement_time, token) for token, since in idle_since.items()]
+            heapq.heapify(self.retirement_deadlines)
 
     def tick(self, ticks: int):
+        tick_start = self.time
+        self.time += ticks
+        starts = [player.position.to_list() for player in self.players]
+
         for player in self.players:
-            estimated_new_position = player.estimate_new_position(ticks)
-            new_position: Point = self.bounded_move(player.position, estimated_new_position)
-            if new_position is not None:
-                player.set_position(new_position)
-            if new_position != estimated_new_position:
-                player.set_speed('', 0.0)
+            self.advance_player(player, tick_start, ticks)
+
+        self.gather(starts, [player.position.to_list() for player in self.players])
+        self.spawn_loot(ticks, len(self.players))
+
+    def advance_player(self, player: Player, tick_start: int, ticks: int):
+        if player.speed.x != 0 or player.speed.y != 0:
+            self.changed_players[player.token] = None
+        estimated_new_position = player.estimate_new_position(ticks)
+        new_position: Point = self.bounded_move(player.position, estimated_new_position)
+        if new_position is not None:
+            player.set_position(new_position)
+        if new_position != estimated_new_position:
+            player.set_speed('', 0.0)
+        # A player standing still by the end of the tick has been idle for the whole tick
+        self.set_idle(player.token, player.speed.x == 0 and player.speed.y == 0, tick_start)
 
     def bounded_move(self, start_point: Point, stop_point: Point) -> Optional[Point]:
-        start_roads: List[Road] = list()
-
-        for road in self.roads:
-            if road.is_on_the_road(start_point):
-                start_roads.append(road)
+        start_roads: List[Road] = self.road_index.get_roads(start_point)
 
         if len(start_roads) == 0:
             logging.warning("Player is not on the road. Position: %s, Map: %s", str(start_point), self.map['id'])
@@ -197,21 +769,26 @@ class GameSession:
 
 class GameServer:
 
-    def __init__(self, config_file_name: Path):  # pathlib
-        try:
-            with open(config_file_name) as f:
-                self.config: dict = json.load(f)
-        except FileNotFoundError:
-            logging.error("Config file is not found. Check the file location: %s", config_file_name)
-            raise
-
-        except json.decoder.JSONDecodeError as ex:
-            logging.error("Unable to load json config. Error: %s", ex.args[0])
-            raise
+    def __init__(self, config_file_name: Path, session_type: Type[GameSession] = GameSession,
+                 seed: Optional[int] = None):  # pathlib
+        self.catalog = load_catalog(config_file_name)
+        self.config: dict = self.catalog.config
 
         self.default_speed = self.config.get('defaultDogSpeed')
-
+        self.loot_generator_config: Optional[dict] = self.config.get('lootGeneratorConfig')
+        self.default_bag_capacity: int = self.config.get('defaultBagCapacity', DEFAULT_BAG_CAPACITY)
+        # Players retire only if the config sets the time, as the servers of the earlier sprints don't do it
+        self.retirement_time: Optional[float] = self.config.get('dogRetirementTime')
+        self.records = Leaderboard()
+
+        self.session_type = session_type
+        # Every session gets its own random generator, seeded by the map id, so it doesn't depend on the others
+        self.seed = seed
         self.sessions: List[GameSession] = list()
+        self.sessions_by_map: Dict[str, GameSession] = dict()
+        self.sessions_by_token: Dict[str, GameSession] = dict()
+
+        self.maps: Optional[Dict[str, dict]] = self.catalog.maps
 
     def get_maps(self) -> Optional[List[dict]]:
         try:
@@ -224,57 +801,93 @@ class GameServer:
             return list()
 
     def get_map(self, map_id: str) -> Optional[dict]:
-        try:
-            for m in self.config['maps']:
-                if m['id'] == map_id:
-                    return m
-        except KeyError:
+        if self.maps is None:
             logging.warning("There is a problem with maps in config. Config: %s", json.dumps(self.config))
             return None
 
+        m = self.maps.get(map_id)
+        if m is not None:
+            return m
+
         logging.warning("There is no such map. Requested map id: %s, available maps: %s",
                         map_id, json.dumps(self.get_maps()))
         return None
 
-    def join(self, username: str, map_id: str, token: str, player_id: int, position: Point) -> bool:
+    def make_loot_generator(self) -> Optional[LootGenerator]:
+        if self.loot_generator_config is None:
+            return None
+        return LootGenerator(self.loot_generator_config['period'], self.loot_generator_config['probability'])
 
-        for session in self.sessions:
-            session: GameSession
-            if session.map['id'] == map_id:
-                session.add_player(username, token, player_id, position)
-                return True
+    def get_session(self, map_id: str) -> Optional[GameSession]:
+        """
+        Session of the map, it's started on the first call
+        """
+        session: Optional[GameSession] = self.sessions_by_map.get(map_id)
+
+        if session is None:
+            _map = self.get_map(map_id)
+            if _map is None:
+                return None
+
+            session = self.session_type(_map, self.default_speed, loot_generator=self.make_loot_generator(),
+                                        seed=f'{self.seed}:{map_id}' if self.seed is not None else None,
+                                        default_bag_capacity=self.default_bag_capacity,
+                                        retirement_time=self.retirement_time)
+            self.sessions.append(session)
+            self.sessions_by_map[map_id] = session
 
-        _map = self.get_map(map_id)
-        if _map is None:
+        return session
+
+    def join(self, username: str, map_id: str, token: str, player_id: int, position: Point) -> bool:
+
+        session: Optional[GameSession] = self.get_session(map_id)
+        if session is None:
             return False
 
-        session = GameSession(_map, self.default_speed)
         session.add_player(username, token, player_id, position)
-        self.sessions.append(session)
+        self.sessions_by_token[token] = session
         return True
 
     def get_state(self, token: str) -> Optional[dict]:
-        for session in self.sessions:
-            session: GameSession
-            for player in session.players:
-                player: Player
-                if player.token == token:
-                    return session.get_state()
-        return None
+        session: Optional[GameSession] = self.sessions_by_token.get(token)
+        if session is None:
+            return None
+        return session.get_state()
+
+    def get_state_delta(self, token: str, since: int) -> Optional[dict]:
+        session: Optional[GameSession] = self.sessions_by_token.get(token)
+        if session is None:
+            return None
+        return session.get_state_delta(since)
 
     def move(self, token: str, direction: str) -> bool:
+        session: Optional[GameSession] = self.sessions_by_token.get(token)
+        if session is None:
+            return False    # There is no such player
+        return session.move(token, direction)
+
+    def set_lost_objects(self, token: str, lost_objects: dict) -> bool:
+        session: Optional[GameSession] = self.sessions_by_token.get(token)
+        if session is None:
+            return False
+        session.set_lost_objects(lost_objects)
+        return True
 
-        for session in self.sessions:
-            session: GameSession
-            for player in session.players:
-                if player.token == token:
-                    player.set_speed(direction, session.default_speed)
-                    return True
-        return False    # There is no such player
+    def get_records(self, start: int = 0, max_items: int = 100) -> List[dict]:
+        return self.records.get(start, max_items)
 
-    def tick(self, ticks: int):
+    def tick(self, ticks: int) -> List[str]:
+        """
+        Advances all sessions and returns the tokens of the players retired by this tick
+        """
+        retired = list()
         for session in self.sessions:
             session.tick(ticks)
+            for token, record in session.retire_expired().items():
+                del self.sessions_by_token[token]
+                self.records.add(record)
+                retired.append(token)
+        return retired
 
 
 def bound(bound_1: float, bound_2: float, value: float) -> float:
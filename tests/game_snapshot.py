@@ -0,0 +1,382 @@
+"""
+Compact binary snapshots of the reference GameServer, the counterpart of the C++ server's --state-file.
+
+A snapshot is a header followed by a string table and per-session sections. Strings (tokens, names, map ids)
+are interned into the table and referenced by index, numbers are stored as packed little-endian arrays.
+A delta snapshot holds only the players changed since the previous save, like --save-state-period does:
+
+    writer = SnapshotWriter(game_server)
+    base = writer.save()
+    delta = writer.save_delta()
+    restored = restore(config_path, [base, delta])
+"""
+
+from __future__ import annotations
+
+import struct
+
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Type
+
+import numpy as np
+
+from game_server import GameServer, GameSession, LostObject, Point
+
+
+MAGIC = b'GSNP'
+VERSION = 1
+
+FULL = 0
+DELTA = 1
+
+HEADER = struct.Struct('<4sHB')
+
+# No idle time / no loot generator
+NOT_IDLE = -1
+NO_TIMER = float('nan')
+
+PLAYER_KEYS = ('id', 'token', 'name', 'position', 'speed', 'direction', 'score', 'join_time', 'idle_since', 'bag')
+
+
+class Encoder:
+
+    def __init__(self):
+        self.strings: Dict[str, int] = dict()
+        self.body = bytearray()
+
+    def intern(self, value: str) -> int:
+        index = self.strings.get(value)
+        if index is None:
+            index = len(self.strings)
+            self.strings[value] = index
+        return index
+
+    def pack(self, fmt: str, *values):
+        self.body += struct.pack('<' + fmt, *values)
+
+    def array(self, values, dtype) -> None:
+        values = np.ascontiguousarray(values, dtype=np.dtype(dtype).newbyteorder('<'))
+        self.pack('Q', values.size)
+        self.body += values.tobytes()
+
+    def string_array(self, values: Iterable[str]):
+        self.array([self.intern(value) for value in values], np.uint32)
+
+    def finish(self, kind: int) -> bytes:
+        encoded = [value.encode() for value in self.strings]
+        lengths = np.array([len(value) for value in encoded], dtype='<u4')
+        table = struct.pack('<Q', len(encoded)) + lengths.tobytes() + b''.join(encoded)
+        return HEADER.pack(MAGIC, VERSION, kind) + table + bytes(self.body)
+
+
+class Decoder:
+
+    def __init__(self, data: bytes):
+        self.data = memoryview(data)
+        magic, version, self.kind = HEADER.unpack_from(self.data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'Not a game snapshot of version {VERSION}')
+        self.offset = HEADER.size
+
+        count, = self.unpack('Q')
+        lengths = np.frombuffer(self.data, dtype='<u4', count=count, offset=self.offset)
+        self.offset += lengths.nbytes
+        ends = (self.offset + np.cumsum(lengths, dtype=np.int64)).tolist()
+        starts = [self.offset] + ends[:-1]
+        self.strings = [str(self.data[start:end], 'utf-8') for start, end in zip(starts, ends)]
+        self.offset = ends[-1] if ends else self.offset
+
+    def unpack(self, fmt: str) -> tuple:
+        fmt = struct.Struct('<' + fmt)
+        values = fmt.unpack_from(self.data, self.offset)
+        self.offset += fmt.size
+        return values
+
+    def array(self, dtype) -> np.ndarray:
+        count, = self.unpack('Q')
+        values = np.frombuffer(self.data, dtype=np.dtype(dtype).newbyteorder('<'), count=count, offset=self.offset)
+        self.offset += values.nbytes
+        return values.astype(dtype)
+
+    def string_array(self) -> List[str]:
+        return [self.strings[i] for i in self.array(np.uint32).tolist()]
+
+
+def dump_session_players(session: GameSession) -> dict:
+    players = session.dump_players()
+    tokens = list(players['token'])
+    return {
+        'id': np.asarray(players['id'], dtype=np.int64),
+        'token': tokens,
+        'name': list(players['name']),
+        'position': np.asarray(players['position'], dtype=np.float64).reshape(-1, 2),
+        'speed': np.asarray(players['speed'], dtype=np.float64).reshape(-1, 2),
+        'direction': np.asarray(players['direction'], dtype=np.int8),
+        'score': np.asarray(players['score'], dtype=np.int64),
+        'join_time': np.array([session.join_times[token] for token in tokens], dtype=np.int64),
+        'idle_since': np.array([session.idle_since.get(token, NOT_IDLE) for token in tokens], dtype=np.int64),
+        'bag': players['bag'],
+    }
+
+
+def select_players(players: dict, rows: np.ndarray) -> dict:
+    selected = dict()
+    rows_list = rows.tolist()
+    for key in PLAYER_KEYS:
+        column = players[key]
+        selected[key] = column[rows] if isinstance(column, np.ndarray) else [column[i] for i in rows_list]
+    return selected
+
+
+def encode_players(encoder: Encoder, players: dict):
+    encoder.array(players['id'], np.int64)
+    encoder.string_array(players['token'])
+    encoder.string_array(players['name'])
+    encoder.array(players['position'], np.float64)
+    encoder.array(players['speed'], np.float64)
+    encoder.array(players['direction'], np.int8)
+    encoder.array(players['score'], np.int64)
+    encoder.array(players['join_time'], np.int64)
+    encoder.array(players['idle_since'], np.int64)
+
+    bags = players['bag']
+    encoder.array([len(bag) for bag in bags], np.uint32)
+    encoder.array([item for bag in bags for item in bag], np.int64)
+
+
+def decode_players(decoder: Decoder) -> dict:
+    players = {
+        'id': decoder.array(np.int64),
+        'token': decoder.string_array(),
+        'name': decoder.string_array(),
+        'position': decoder.array(np.float64).reshape(-1, 2),
+        'speed': decoder.array(np.float64).reshape(-1, 2),
+        'direction': decoder.array(np.int8),
+        'score': decoder.array(np.int64),
+        'join_time': decoder.array(np.int64),
+        'idle_since': decoder.array(np.int64),
+    }
+    counts = decoder.array(np.uint32)
+    items = decoder.array(np.int64).reshape(-1, 2).tolist()
+    ends = np.cumsum(counts).tolist()
+    players['bag'] = [[tuple(item) for item in items[end - count:end]] for count, end in zip(counts.tolist(), ends)]
+    return players
+
+
+def encode_session(encoder: Encoder, session: GameSession, players: dict, removed: np.ndarray):
+    generator = session.loot_generator
+    version, internal_state, gauss_next = session.random.getstate()
+
+    encoder.pack('I', encoder.intern(session.map['id']))
+    encoder.pack('qqd', session.time, session.next_loot_id,
+                 generator.time_without_loot if generator is not None else NO_TIMER)
+    encoder.pack('Bd', version, gauss_next if gauss_next is not None else NO_TIMER)
+    encoder.array(internal_state, np.uint32)
+
+    encode_players(encoder, players)
+    encoder.array(removed, np.int64)
+
+    lost_objects = list(session.lost_objects.values())
+    encoder.array([lost_object.id for lost_object in lost_objects], np.int64)
+    encoder.array([lost_object.type for lost_object in lost_objects], np.int64)
+    encoder.array([lost_object.position.to_list() for lost_object in lost_objects], np.float64)
+
+
+def decode_session(decoder: Decoder) -> dict:
+    map_index, = decoder.unpack('I')
+    time, next_loot_id, time_without_loot = decoder.unpack('qqd')
+    version, gauss_next = decoder.unpack('Bd')
+    internal_state = tuple(decoder.array(np.uint32).tolist())
+
+    return {
+        'map_id': decoder.strings[map_index],
+        'time': time,
+        'next_loot_id': next_loot_id,
+        'time_without_loot': time_without_loot,
+        'random': (version, internal_state, None if np.isnan(gauss_next) else gauss_next),
+        'players': decode_players(decoder),
+        'removed': decoder.array(np.int64),
+        'lost_objects': (decoder.array(np.int64).tolist(), decoder.array(np.int64).tolist(),
+                         decoder.array(np.float64).reshape(-1, 2).tolist()),
+    }
+
+
+def encode_records(encoder: Encoder, records: List[dict]):
+    encoder.string_array(record['name'] for record in records)
+    encoder.array([record['score'] for record in records], np.int64)
+    encoder.array([record['playTime'] for record in records], np.float64)
+
+
+def decode_records(decoder: Decoder) -> List[dict]:
+    names = decoder.string_array()
+    scores = decoder.array(np.int64).tolist()
+    play_times = decoder.array(np.float64).tolist()
+    return [{'name': name, 'score': score, 'playTime': play_time}
+            for name, score, play_time in zip(names, scores, play_times)]
+
+
+def match_ids(ids: np.ndarray, saved_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Mask of the ids present in `saved_ids`, and their rows there (meaningful where the mask is set)
+    """
+    if len(saved_ids) == 0:
+        return np.zeros(len(ids), dtype=bool), np.zeros(len(ids), dtype=np.int64)
+
+    order = np.argsort(saved_ids, kind='stable')
+    found = np.minimum(np.searchsorted(saved_ids[order], ids), len(saved_ids) - 1)
+    rows = order[found]
+    return saved_ids[rows] == ids, rows
+
+
+def changed_players(players: dict, saved: Optional[dict]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Rows of the players added or changed since the saved columns, and the ids of the removed players.
+    A player may pick up loot and come back to the saved position, so the bags and scores are compared too
+    """
+    if saved is None or len(saved['id']) == 0:
+        return np.arange(len(players['id'])), np.zeros(0, dtype=np.int64)
+
+    known, rows = match_ids(players['id'], saved['id'])
+    changed = ~known
+    for key in ('position', 'speed'):
+        changed |= known & (players[key] != saved[key][rows]).any(axis=1)
+    for key in ('direction', 'score', 'idle_since'):
+        changed |= known & (players[key] != saved[key][rows])
+
+    # Bags are lists of different lengths, they are compared row by row where nothing else has changed
+    bags, saved_bags = players['bag'], saved['bag']
+    for row in np.flatnonzero(~changed).tolist():
+        if bags[row] != saved_bags[rows[row]]:
+            changed[row] = True
+
+    removed = np.setdiff1d(saved['id'], players['id'])
+    return np.flatnonzero(changed), removed
+
+
+class SnapshotWriter:
+    """
+    Saves full and delta snapshots of the server. The columns of the last save are kept to find the changes
+    """
+
+    def __init__(self, server: GameServer):
+        self.server = server
+        self.saved: Optional[Dict[str, dict]] = None
+        self.saved_records = 0
+
+    def save(self) -> bytes:
+        return self.write(FULL)
+
+    def save_delta(self) -> bytes:
+        """
+        Players changed since the previous save, a full snapshot if nothing has been saved yet
+        """
+        return self.write(DELTA if self.saved is not None else FULL)
+
+    def write(self, kind: int) -> bytes:
+        encoder = Encoder()
+        saved: Dict[str, dict] = dict()
+
+        encoder.pack('Q', len(self.server.sessions))
+        for session in self.server.sessions:
+            players = dump_session_players(session)
+            map_id = session.map['id']
+            saved[map_id] = players
+
+            if kind == FULL:
+                encode_session(encoder, session, players, np.zeros(0, dtype=np.int64))
+            else:
+                rows, removed = changed_players(players, self.saved.get(map_id))
+                encode_session(encoder, session, select_players(players, rows), removed)
+
+        records = self.server.records.added_since(self.saved_records if kind == DELTA else 0)
+        encode_records(encoder, records)
+
+        self.saved = saved
+        self.saved_records = len(self.server.records)
+        return encoder.finish(kind)
+
+
+def merge_players(players: dict, changes: dict, removed: np.ndarray) -> dict:
+    """
+    Applies a delta: the changed players are replaced in place, the new ones are appended
+    and the removed ones are dropped, so the players order is kept
+    """
+    known, rows = match_ids(changes['id'], players['id'])
+    targets = rows[known].tolist()
+    updates = np.flatnonzero(known).tolist()
+    added = np.flatnonzero(~known)
+
+    merged = dict()
+    for key in PLAYER_KEYS:
+        column = players[key]
+        change = changes[key]
+        if isinstance(column, np.ndarray):
+            column = column.copy()
+            column[targets] = change[updates]
+            merged[key] = np.concatenate([column, change[added]])
+        else:
+            column = list(column)
+            for target, update in zip(targets, updates):
+                column[target] = change[update]
+            merged[key] = column + [change[i] for i in added.tolist()]
+
+    return select_players(merged, np.flatnonzero(~np.isin(merged['id'], removed)))
+
+
+def load(snapshots: Iterable[bytes]) -> Tuple[Dict[str, dict], List[dict]]:
+    """
+    Folds a full snapshot and the following deltas into the sessions by map id and the records
+    """
+    sessions: Dict[str, dict] = dict()
+    records: List[dict] = list()
+
+    for data in snapshots:
+        decoder = Decoder(data)
+        if decoder.kind == FULL:
+            sessions = dict()
+            records = list()
+
+        count, = decoder.unpack('Q')
+        for _ in range(count):
+            session = decode_session(decoder)
+            previous = sessions.get(session['map_id'])
+            if decoder.kind == DELTA and previous is not None:
+                session['players'] = merge_players(previous['players'], session['players'], session['removed'])
+            sessions[session['map_id']] = session
+
+        records.extend(decode_records(decoder))
+
+    return sessions, records
+
+
+def restore(config_file_name: Path, snapshots: Iterable[bytes],
+            session_type: Type[GameSession] = GameSession) -> GameServer:
+    """
+    A new server for the config in the state of the last snapshot
+    """
+    server = GameServer(config_file_name, session_type)
+    sessions, records = load(snapshots)
+
+    for map_id, saved in sessions.items():
+        session = server.get_session(map_id)
+        if session is None:
+            raise ValueError(f'The snapshot has a session on the map {map_id} missing in the config')
+
+        players = saved['players']
+        tokens = players['token']
+        idle_since = {token: since for token, since in zip(tokens, players['idle_since'].tolist())
+                      if since != NOT_IDLE}
+        session.restore_clock(saved['time'], dict(zip(tokens, players['join_time'].tolist())), idle_since)
+        session.load_players(players)
+
+        session.next_loot_id = saved['next_loot_id']
+        session.random.setstate(saved['random'])
+        if session.loot_generator is not None and not np.isnan(saved['time_without_loot']):
+            session.loot_generator.time_without_loot = saved['time_without_loot']
+        for loot_id, loot_type, position in zip(*saved['lost_objects']):
+            session.lost_objects[loot_id] = LostObject(loot_id, loot_type, Point(*position))
+
+        server.sessions_by_token.update((token, session) for token in tokens)
+
+    server.records.extend(records)
+    return server
@@ -0,0 +1,153 @@
+"""
+Large random scenes for the gather detector, stored in a compact binary format:
+
+    b'GTHR', uint32 version, uint64 items count, uint64 gatherers count,
+    items as float64 (x, y, width), then gatherers as float64 (start x, start y, end x, end y, width)
+
+Events written by cpp/test_s03_gather/scenario-runner.cpp are EVENT_DTYPE records
+"""
+
+import json
+import subprocess
+
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, Optional, Tuple, Union
+
+import numpy as np
+
+from collision_detector import EVENT_DTYPE, find_gather_events_arrays
+
+
+SCENARIO_MAGIC = b'GTHR'
+SCENARIO_VERSION = 1
+HEADER_DTYPE = np.dtype([('magic', 'S4'), ('version', '<u4'), ('items', '<u8'), ('gatherers', '<u8')])
+ITEM_DTYPE = np.dtype([('x', '<f8'), ('y', '<f8'), ('width', '<f8')])
+GATHERER_DTYPE = np.dtype([('start_x', '<f8'), ('start_y', '<f8'), ('end_x', '<f8'), ('end_y', '<f8'),
+                           ('width', '<f8')])
+RUNNER_EVENT_DTYPE = np.dtype([('item_id', '<u8'), ('gatherer_id', '<u8'), ('sq_distance', '<f8'),
+                               ('time', '<f8')])
+
+CHUNK_SIZE = 1 << 20
+
+
+def random_items(rng: np.random.Generator, count: int, size: float) -> Iterator[np.ndarray]:
+    for begin in range(0, count, CHUNK_SIZE):
+        items = np.zeros(min(CHUNK_SIZE, count - begin), dtype=ITEM_DTYPE)
+        items['x'] = rng.uniform(0, size, len(items))
+        items['y'] = rng.uniform(0, size, len(items))
+        items['width'] = rng.choice([0.0, 0.3, 0.5], len(items))
+        yield items
+
+
+def random_gatherers(rng: np.random.Generator, count: int, size: float) -> Iterator[np.ndarray]:
+    for begin in range(0, count, CHUNK_SIZE):
+        gatherers = np.zeros(min(CHUNK_SIZE, count - begin), dtype=GATHERER_DTYPE)
+        # Dogs run along the roads, so most of the moves are axis-aligned, some don't move at all
+        start_x = rng.uniform(0, size, len(gatherers))
+        start_y = rng.uniform(0, size, len(gatherers))
+        length = rng.uniform(-20, 20, len(gatherers))
+        kind = rng.integers(0, 10, len(gatherers))
+        gatherers['start_x'] = start_x
+        gatherers['start_y'] = start_y
+        gatherers['end_x'] = np.where(kind < 4, start_x + length, start_x)
+        gatherers['end_y'] = np.where((kind >= 4) & (kind < 8), start_y + length, start_y)
+        diagonal = kind == 8
+        gatherers['end_x'][diagonal] += rng.uniform(-20, 20, np.count_nonzero(diagonal))
+        gatherers['end_y'][diagonal] += rng.uniform(-20, 20, np.count_nonzero(diagonal))
+        gatherers['width'] = 0.6
+        yield gatherers
+
+
+def generate_scenario(path: Union[str, Path], items: int, gatherers: int, seed: int = 0,
+                      size: Optional[float] = None):
+    """
+    Streams a random scene to the file chunk by chunk, so millions of objects don't have to fit in memory.
+    By default the scene size keeps about one item or gatherer per square unit
+    """
+    rng = np.random.default_rng(seed)
+    size = size if size is not None else max(np.sqrt(max(items, gatherers)), 1.0)
+
+    with open(path, 'wb') as f:
+        header = np.array([(SCENARIO_MAGIC, SCENARIO_VERSION, items, gatherers)], dtype=HEADER_DTYPE)
+        header.tofile(f)
+        for chunk in random_items(rng, items, size):
+            chunk.tofile(f)
+        for chunk in random_gatherers(rng, gatherers, size):
+            chunk.tofile(f)
+
+
+def load_scenario(path: Union[str, Path]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Memory-mapped items and gatherers of the scenario file
+    """
+    header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)[0]
+    if header['magic'] != SCENARIO_MAGIC or header['version'] != SCENARIO_VERSION:
+        raise ValueError(f'Unsupported scenario file: {path}')
+
+    items_offset = HEADER_DTYPE.itemsize
+    gatherers_offset = items_offset + int(header['items']) * ITEM_DTYPE.itemsize
+    items = np.memmap(path, dtype=ITEM_DTYPE, mode='r', offset=items_offset, shape=(int(header['items']),))
+    gatherers = np.memmap(path, dtype=GATHERER_DTYPE, mode='r', offset=gatherers_offset,
+                          shape=(int(header['gatherers']),))
+    return items, gatherers
+
+
+def find_shard_events(path: Union[str, Path], begin: int, end: int) -> np.ndarray:
+    items, gatherers = load_scenario(path)
+    shard = np.asarray(gatherers[begin:end])
+    events = find_gather_events_arrays(
+        np.stack([items['x'], items['y']], axis=1), items['width'],
+        np.stack([shard['start_x'], shard['start_y']], axis=1),
+        np.stack([shard['end_x'], shard['end_y']], axis=1),
+        shard['width'])
+    events['gatherer_id'] += begin
+    return events
+
+
+def find_oracle_events(path: Union[str, Path], workers: Optional[int] = None, shards: int = 16) -> np.ndarray:
+    """
+    Python oracle events of the scenario. Gatherers are split into shards handled by worker processes,
+    the result is ordered by time, then by the gatherer and then by the item
+    """
+    _, gatherers = load_scenario(path)
+    bounds = np.linspace(0, len(gatherers), min(shards, len(gatherers)) + 1, dtype=np.int64)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(find_shard_events, path, int(begin), int(end))
+                   for begin, end in zip(bounds[:-1], bounds[1:])]
+        results = [future.result() for future in futures]
+
+    events = np.concatenate(results) if results else np.zeros(0, dtype=EVENT_DTYPE)
+    return events[np.lexsort((events['item_id'], events['gatherer_id'], events['time']))]
+
+
+def run_detector(detector: Union[str, Path], scenario: Union[str, Path],
+                 events_path: Union[str, Path]) -> Tuple[np.ndarray, float]:
+    """
+    Events detected by the compiled scenario runner, in its order, and the FindGatherEvents time in seconds
+    """
+    output = subprocess.run([str(detector), str(scenario), str(events_path)],
+                            check=True, capture_output=True, text=True).stdout
+    report = json.loads(output)
+    events = np.fromfile(events_path, dtype=RUNNER_EVENT_DTYPE).astype(EVENT_DTYPE)
+    return events, float(report['elapsed'])
+
+
+def compare_events(expected: np.ndarray, actual: np.ndarray):
+    """
+    Asserts that the detector events are ordered by time and equal the oracle events.
+    The order of the events with the same time is unspecified
+    """
+    assert np.all(np.diff(actual['time']) >= 0), 'Events aren\'t ordered by time'
+    assert len(actual) == len(expected), f'{len(expected)} events were expected, but {len(actual)} were given'
+
+    actual = actual[np.lexsort((actual['item_id'], actual['gatherer_id'], actual['time']))]
+    for field in ['item_id', 'gatherer_id']:
+        mismatch = np.flatnonzero(actual[field] != expected[field])
+        assert len(mismatch) == 0, f'Event {mismatch[0]}: {expected[mismatch[0]]} was expected, ' \
+                                   f'but {actual[mismatch[0]]} was given'
+    for field in ['sq_distance', 'time']:
+        mismatch = np.flatnonzero(~np.isclose(actual[field], expected[field], rtol=1e-9, atol=1e-12))
+        assert len(mismatch) == 0, f'Event {mismatch[0]}: {expected[mismatch[0]]} was expected, ' \
+                                   f'but {actual[mismatch[0]]} was given'
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Union
+
+import numpy as np
+
+
+class LatencyHistogram:
+    """
+    Log-bucketed histogram of non-negative integer values, e.g. response times in microseconds.
+    Values below 2 ** precision are counted exactly, larger ones fall into buckets narrower than
+    2 ** (1 - precision) of their value, so percentiles have the same bounded relative error.
+    Histograms with the same precision can be merged and saved to disk
+    """
+
+    def __init__(self, precision: int = 10):
+        self.precision = precision
+        self.counts = np.zeros(2 ** precision, dtype=np.int64)
+        self.total = 0
+
+    def bucket_indices(self, values: np.ndarray) -> np.ndarray:
+        values = np.asarray(values, dtype=np.int64)
+        if len(values) and values.min() < 0:
+            raise ValueError('Histogram values can\'t be negative')
+
+        # Bit length of the value, frexp is exact for integers below 2 ** 53
+        _, bit_length = np.frexp(values.astype(np.float64))
+        shift = np.maximum(bit_length - self.precision, 0).astype(np.int64)
+        half = 2 ** (self.precision - 1)
+        # Values with shift > 0 have a mantissa in [half, 2 * half), the other ones are exact
+        return np.where(shift == 0, values, 2 * half + (shift - 1) * half + ((values >> shift) - half))
+
+    def bucket_bounds(self, indices: np.ndarray):
+        """
+        The lowest and the highest value of the buckets
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        half = 2 ** (self.precision - 1)
+        shift = np.where(indices < 2 * half, 0, (indices - 2 * half) // half + 1)
+        mantissa = np.where(shift == 0, indices, (indices - 2 * half) % half + half)
+        return mantissa << shift, ((mantissa + 1) << shift) - 1
+
+    def add(self, values: np.ndarray):
+        indices = self.bucket_indices(values)
+        if len(indices) == 0:
+            return
+
+        self.reserve(int(indices.max()) + 1)
+        self.counts += np.bincount(indices, minlength=len(self.counts))
+        self.total += len(indices)
+
+    def reserve(self, size: int):
+        if size > len(self.counts):
+            counts = np.zeros(size, dtype=np.int64)
+            counts[:len(self.counts)] = self.counts
+            self.counts = counts
+
+    def merge(self, other: LatencyHistogram) -> LatencyHistogram:
+        if other.precision != self.precision:
+            raise ValueError(f'Unable to merge histograms with precisions {self.precision} and {other.precision}')
+
+        self.reserve(len(other.counts))
+        self.counts[:len(other.counts)] += other.counts
+        self.total += other.total
+        return self
+
+    def value_at_rank(self, rank: int) -> int:
+        """
+        The highest value of the bucket holding the sample with the given rank (0-based, ascending)
+        """
+        index = int(np.searchsorted(np.cumsum(self.counts), rank, side='right'))
+        _, upper = self.bucket_bounds(np.array([index]))
+        return int(upper[0])
+
+    def percentile(self, q: float) -> float:
+        """
+        The same interpolation as np.percentile over the original values, within the bucket error
+        """
+        if self.total == 0:
+            raise ValueError('Unable to get a percentile of an empty histogram')
+
+        rank = q / 100 * (self.total - 1)
+        lower_rank = int(np.floor(rank))
+        lower = self.value_at_rank(lower_rank)
+        upper = self.value_at_rank(min(lower_rank + 1, self.total - 1))
+        return lower + (upper - lower) * (rank - lower_rank)
+
+    def save(self, path: Union[str, Path]):
+        # Only the non-empty buckets are stored
+        indices = np.flatnonzero(self.counts)
+        with open(path, 'wb') as f:
+            np.savez_compressed(f, precision=self.precision, indices=indices, counts=self.counts[indices])
+
+    @staticmethod
+    def load(path: Union[str, Path]) -> LatencyHistogram:
+        with np.load(path) as data:
+            histogram = LatencyHistogram(int(data['precision']))
+            indices = data['indices']
+            if len(indices):
+                histogram.reserve(int(indices.max()) + 1)
+                histogram.counts[indices] = data['counts']
+            histogram.total = int(histogram.counts.sum())
+        return histogram
@@ -0,0 +1,152 @@
+"""
+Pull parser of a JSON document arriving in chunks, e.g. `requests.Response.iter_content`. The structure is
+walked by the caller, and every value it asks for is decoded by the C scanner of the json module as soon as
+it's complete, so only the current value and a chunk are kept in memory:
+
+    stream = JsonStream(res.iter_content(65536))
+    for key in stream.members():
+        if key == 'players':
+            for player_id in stream.members():
+                player = stream.value()
+        else:
+            stream.value()
+    stream.finish()
+"""
+
+import re
+import json
+import codecs
+
+from typing import Any, Iterable, Iterator
+
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+# A value failing this close to the end of the buffer may just be cut by the chunk boundary,
+# e.g. `fals` or `1.5e`, so the next chunk is read before reporting it
+INCOMPLETE_MARGIN = 32
+
+
+class JsonStream:
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self.chunks = iter(chunks)
+        self.utf8 = codecs.getincrementaldecoder('utf-8')()
+        self.decoder = json.JSONDecoder()
+        self.text = ''
+        self.pos = 0
+        # Characters dropped from the beginning of the buffer, and bytes read from the chunks
+        self.offset = 0
+        self.size = 0
+        self.exhausted = False
+
+    def fill(self) -> bool:
+        """
+        Appends the next chunk to the buffer, and drops the part of the buffer already parsed
+        """
+        if self.exhausted:
+            return False
+        try:
+            chunk = next(self.chunks)
+        except StopIteration:
+            self.exhausted = True
+            self.text = self.text[self.pos:] + self.decode(b'', final=True)
+        else:
+            self.size += len(chunk)
+            self.text = self.text[self.pos:] + self.decode(chunk)
+        self.offset += self.pos
+        self.pos = 0
+        return True
+
+    def decode(self, chunk: bytes, final: bool = False) -> str:
+        # Bad UTF-8, e.g. a character cut at the end of the document, is reported like any other bad JSON
+        try:
+            return self.utf8.decode(chunk, final)
+        except UnicodeDecodeError as ex:
+            raise json.JSONDecodeError(f'Invalid UTF-8: {ex.reason}', self.text, len(self.text))
+
+    def grow(self) -> bool:
+        """
+        Reads chunks until the unparsed part of the buffer doubles, so a long value is decoded
+        O(log n) times rather than once per chunk
+        """
+        target = 2 * (len(self.text) - self.pos)
+        grown = False
+        while self.fill():
+            grown = True
+            if len(self.text) - self.pos >= target:
+                break
+        return grown
+
+    def peek(self) -> str:
+        """
+        The next character after the whitespace, or '' at the end of the document
+        """
+        # Compact JSON has no whitespace between the tokens
+        if self.pos < len(self.text) and self.text[self.pos] not in ' \t\n\r':
+            return self.text[self.pos]
+        while True:
+            self.pos = WHITESPACE.match(self.text, self.pos).end()
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, characters: str) -> str:
+        character = self.peek()
+        if character == '' or character not in characters:
+            raise json.JSONDecodeError(f'Expecting one of {characters!r}', self.text, self.pos)
+        self.pos += 1
+        return character
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError as je:
+                incomplete = len(self.text) - je.pos <= INCOMPLETE_MARGIN or je.msg.startswith('Unterminated string')
+                if incomplete and self.grow():
+                    continue
+                raise
+            # A number near the end of the buffer may continue in the next chunk, e.g. `1` and `.5e3`
+            if type(value) in (int, float) and len(self.text) - end <= INCOMPLETE_MARGIN and self.grow():
+                continue
+            self.pos = end
+            return value
+
+    def members(self) -> Iterator[str]:
+        """
+        Keys of an object. The caller reads the value of every key before taking the next one
+        """
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            if type(key) is not str:
+                raise json.JSONDecodeError('Expecting property name enclosed in double quotes', self.text, self.pos)
+            self.expect(':')
+            yield key
+            if self.expect(',}') == '}':
+                return
+
+    def items(self) -> Iterator[None]:
+        """
+        Positions of the items of an array. The caller reads every item before taking the next one
+        """
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield
+            if self.expect(',]') == ']':
+                return
+
+    def finish(self):
+        """
+        Checks that nothing but whitespace follows the document, and reads the rest of the chunks
+        """
+        if self.peek() != '':
+            raise json.JSONDecodeError('Extra data', self.text, self.pos)
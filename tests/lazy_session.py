@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import heapq
+
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+from game_server import DEFAULT_BAG_CAPACITY, GameSession, LootGenerator, Player, Point
+
+
+class LazyGameSession(GameSession):
+    """
+    Drop-in replacement for GameSession that doesn't move the players on a tick. Ticks are queued,
+    and a player catches up with them only when the state is read or its speed changes, so a tick costs
+    O(1) instead of O(players), and the players standing still are never visited.
+
+    Catching up replays the pending ticks of the player one by one, as `GameSession.tick` does, up to
+    the tick the player stops in. A single move over all of them is used only when it is exact: the player
+    stays on a single road, so no tick bounds it. Otherwise a player may cross onto a road adjoining the end
+    of its road within a run of ticks, which a single move bounded by the first road would miss.
+    The results are identical to GameSession, including the idle times and retirements.
+
+    Gathering needs the path of every player in every tick, so while there are lost objects to pick up,
+    or items in the bags to hand over at an office, the ticks are applied eagerly. Players with empty bags
+    passing an office change nothing
+    """
+
+    def __init__(self, game_map: dict, default_speed, loot_generator: Optional[LootGenerator] = None,
+                 seed: Optional[Union[int, str]] = None, default_bag_capacity: int = DEFAULT_BAG_CAPACITY,
+                 retirement_time: Optional[float] = None):
+        super().__init__(game_map, default_speed, loot_generator, seed, default_bag_capacity, retirement_time)
+
+        # Ticks not applied to all players yet, as (tick start, ticks). Ticks are numbered from the start
+        # of the session, the first pending one is number `pending_base`
+        self.pending_ticks: List[Tuple[int, int]] = list()
+        self.pending_base = 0
+        # Number of the first tick not applied to the player yet, by token
+        self.applied_ticks: Dict[str, int] = dict()
+        # Min-heap of (time, token). A moving player can't retire before the time, so it is caught up then
+        self.catch_up_times: List[Tuple[float, str]] = list()
+        # Tokens of the players with items in the bag. Bags change only in eager ticks and on loading
+        self.loaded_bags: Set[str] = set()
+
+    @property
+    def tick_count(self) -> int:
+        return self.pending_base + len(self.pending_ticks)
+
+    def add_player(self, name: str, token: str, _id: int, position: Point):
+        super().add_player(name, token, _id, position)
+        self.applied_ticks[token] = self.tick_count
+
+    def move(self, token: str, direction: str) -> bool:
+        player = self.players_by_token.get(token)
+        if player is None:
+            return False
+
+        # The pending ticks are applied with the old speed
+        self.catch_up(player)
+        if self.retirement_time is not None:
+            # The next tick starts or stops counting the idle time of the player
+            heapq.heappush(self.catch_up_times, (self.time, token))
+        return super().move(token, direction)
+
+    def refresh_state(self):
+        self.catch_up_all()
+        super().refresh_state()
+
+    def dump_players(self) -> dict:
+        self.catch_up_all()
+        return super().dump_players()
+
+    def load_players(self, players: dict):
+        super().load_players(players)
+        for player in self.players:
+            if player.token in self.applied_ticks:
+                continue
+            self.applied_ticks[player.token] = self.tick_count
+            if len(player.bag) != 0:
+                self.loaded_bags.add(player.token)
+            if self.retirement_time is not None and (player.speed.x != 0 or player.speed.y != 0):
+                heapq.heappush(self.catch_up_times, (self.time, player.token))
+
+    def restore_clock(self, time: int, join_times: Dict[str, int], idle_since: Dict[str, int]):
+        super().restore_clock(time, join_times, idle_since)
+        self.catch_up_times = list()
+
+    def remove_players(self, tokens: List[str]) -> Dict[str, dict]:
+        records = super().remove_players(tokens)
+        for token in tokens:
+            del self.applied_ticks[token]
+            self.loaded_bags.discard(token)
+        return records
+
+    def retire_expired(self) -> Dict[str, dict]:
+        if self.retirement_time is None:
+            return dict()
+
+        # Players that may have stopped long enough ago are caught up before any deadline is popped,
+        # so their deadlines are retired in the same order as by GameSession
+        moving: Dict[str, None] = dict()
+        while len(self.catch_up_times) != 0 and self.catch_up_times[0][0] <= self.time:
+            _, token = heapq.heappop(self.catch_up_times)
+            player = self.players_by_token.get(token)
+            if player is None:
+                continue
+            self.catch_up(player)
+            if player.speed.x != 0 or player.speed.y != 0:
+                moving[token] = None
+        for token in moving:
+            heapq.heappush(self.catch_up_times, (self.time + self.retirement_time, token))
+
+        return super().retire_expired()
+
+    def tick(self, ticks: int):
+        if len(self.lost_objects) != 0 or (len(self.office_positions) != 0 and len(self.loaded_bags) != 0):
+            self.catch_up_all()
+            super().tick(ticks)
+            self.loaded_bags = {player.token for player in self.players if len(player.bag) != 0}
+            return
+
+        self.pending_ticks.append((self.time, ticks))
+        self.time += ticks
+        self.spawn_loot(ticks, len(self.players))
+
+    def catch_up_all(self):
+        if len(self.pending_ticks) == 0:
+            return
+        for player in self.players:
+            self.catch_up(player)
+        self.pending_base = self.tick_count
+        self.pending_ticks = list()
+
+    def catch_up(self, player: Player):
+        applied = self.applied_ticks[player.token]
+        if applied == self.tick_count:
+            return
+        pending = self.pending_ticks[applied - self.pending_base:]
+        self.applied_ticks[player.token] = self.tick_count
+
+        if player.speed.x == 0 and player.speed.y == 0:
+            # A player standing still stays in place and has been idle since the first pending tick
+            self.set_idle(player.token, True, pending[0][0])
+            return
+
+        self.changed_players[player.token] = None
+        if self.collapse_move(player, pending):
+            self.set_idle(player.token, False, pending[0][0])
+            return
+
+        for tick_start, ticks in pending:
+            self.advance_player(player, tick_start, ticks)
+            if player.speed.x == 0 and player.speed.y == 0:
+                break   # the rest of the ticks leave the player in place
+
+    def collapse_move(self, player: Player, pending: List[Tuple[int, int]]) -> bool:
+        """
+        Moves the player through all the pending ticks at once, if none of them would bound the move.
+        The position is summed tick by tick, the same way as `Player.estimate_new_position` does,
+        so it matches GameSession to the last bit
+        """
+        start = player.position
+        roads = self.road_index.get_roads(start)
+        if len(roads) != 1:
+            return False
+
+        x, y = start.x, start.y
+        speed = player.speed
+        for _, ticks in pending:
+            factor = ticks / 1000
+            x += speed.x * factor
+            y += speed.y * factor
+
+        road = roads[0]
+        stop = Point(x, y)
+        if not road.is_on_the_road(stop):
+            return False
+
+        # The path is straight, so every point of it is on the road too. It may touch no other road,
+        # otherwise a tick starting on that road would be bounded by it as well
+        left_bottom = Point(min(start.x, x), min(start.y, y))
+        right_top = Point(max(start.x, x), max(start.y, y))
+        for cell in self.road_index.cells_of(left_bottom, right_top):
+            for index in self.road_index.cells.get(cell, []):
+                other = self.roads[index]
+                if other is not road and other.left_bottom_corner <= right_top and \
+                        left_bottom <= other.right_top_corner:
+                    return False
+
+        player.set_position(stop)
+        return True
@@ -0,0 +1,131 @@
+"""
+Reference of the /api/v1/game/records table: retired players ordered by the score (descending),
+then by the play time and the name
+"""
+
+from __future__ import annotations
+
+from bisect import bisect_left, insort
+from typing import Iterable, List, Tuple
+
+
+def record_key(record: dict) -> Tuple[float, float, str]:
+    return -record['score'], record['playTime'], record['name']
+
+
+class Leaderboard:
+    """
+    Records kept in order as they come: a list of sorted buckets of at most `2 * load` entries,
+    with a Fenwick tree over the bucket sizes. Adding a record costs O(log n + load),
+    and a `start`/`max_items` page costs O(log n + max_items)
+    """
+
+    def __init__(self, records: Iterable[dict] = (), load: int = 1000):
+        self.load = load
+        # Entries are (*record_key, sequence, record), the sequence keeps equal records apart
+        self.buckets: List[list] = list()
+        self.maxes: List[tuple] = list()
+        self.tree: List[int] = [0]
+        self.size = 0
+        self.sequence = 0
+        # Records in the order they were added
+        self.history: List[dict] = list()
+        self.extend(records)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def make_entry(self, record: dict) -> tuple:
+        entry = (*record_key(record), self.sequence, record)
+        self.sequence += 1
+        self.history.append(record)
+        return entry
+
+    def added_since(self, count: int) -> List[dict]:
+        """
+        Records added after the first `count` ones, in the order they were added
+        """
+        return self.history[count:]
+
+    def extend(self, records: Iterable[dict]):
+        if self.size != 0:
+            for record in records:
+                self.add(record)
+            return
+
+        # Bulk load: a single sort and no splits
+        entries = sorted(self.make_entry(record) for record in records)
+        self.buckets = [entries[i:i + self.load] for i in range(0, len(entries), self.load)]
+        self.maxes = [bucket[-1] for bucket in self.buckets]
+        self.size = len(entries)
+        self.build_tree()
+
+    def add(self, record: dict):
+        entry = self.make_entry(record)
+        self.size += 1
+
+        if len(self.buckets) == 0:
+            self.buckets.append([entry])
+            self.maxes.append(entry)
+            self.build_tree()
+            return
+
+        index = min(bisect_left(self.maxes, entry), len(self.buckets) - 1)
+        bucket = self.buckets[index]
+        insort(bucket, entry)
+        self.maxes[index] = bucket[-1]
+
+        if len(bucket) <= 2 * self.load:
+            self.tree_add(index, 1)
+            return
+
+        # Splitting renumbers the buckets after it, so the tree is rebuilt, once per `load` additions
+        self.buckets[index:index + 1] = [bucket[:self.load], bucket[self.load:]]
+        self.maxes[index:index + 1] = [bucket[self.load - 1], bucket[-1]]
+        self.build_tree()
+
+    def get(self, start: int = 0, max_items: int = 100) -> List[dict]:
+        """
+        Records `start` to `start + max_items` in the table order, like /api/v1/game/records returns them
+        """
+        if start >= self.size or max_items <= 0:
+            return list()
+
+        index, offset = self.locate(start)
+        result: List[dict] = list()
+        while index < len(self.buckets) and len(result) < max_items:
+            bucket = self.buckets[index]
+            end = min(len(bucket), offset + max_items - len(result))
+            result.extend(entry[-1] for entry in bucket[offset:end])
+            index += 1
+            offset = 0
+        return result
+
+    def build_tree(self):
+        # Fenwick tree in the 1-based layout, built in O(number of buckets)
+        self.tree = [0] * (len(self.buckets) + 1)
+        for i, bucket in enumerate(self.buckets, start=1):
+            self.tree[i] += len(bucket)
+            parent = i + (i & -i)
+            if parent < len(self.tree):
+                self.tree[parent] += self.tree[i]
+
+    def tree_add(self, index: int, value: int):
+        i = index + 1
+        while i < len(self.tree):
+            self.tree[i] += value
+            i += i & -i
+
+    def locate(self, position: int) -> Tuple[int, int]:
+        """
+        Bucket holding the record at the position, and the offset of the record in it
+        """
+        index = 0
+        step = 1 << (len(self.tree) - 1).bit_length()
+        while step:
+            following = index + step
+            if following < len(self.tree) and self.tree[following] <= position:
+                index = following
+                position -= self.tree[following]
+            step >>= 1
+        return index, position
@@ -0,0 +1,300 @@
+from __future__ import annotations
+
+import io
+import os
+import glob
+
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from histogram import LatencyHistogram
+
+
+# Columns of the Yandex.Tank phout log, the tag column is the only non-numeric one
+PHOUT_COLUMNS = ['time', 'tag', 'interval_real', 'connect_time', 'send_time', 'latency', 'receive_time',
+                 'interval_event', 'size_out', 'size_in', 'net_code', 'proto_code']
+
+PHOUT_DTYPE = np.dtype([
+    ('time', np.float64),
+    ('interval_real', np.int64),
+    ('connect_time', np.int64),
+    ('send_time', np.int64),
+    ('latency', np.int64),
+    ('receive_time', np.int64),
+    ('interval_event', np.int64),
+    ('size_out', np.int64),
+    ('size_in', np.int64),
+    ('net_code', np.int32),
+    ('proto_code', np.int32),
+])
+
+PHOUT_USECOLS = [PHOUT_COLUMNS.index(name) for name in PHOUT_DTYPE.names]
+
+CHUNK_SIZE = 16 * 1024 * 1024
+
+# Histogram precisions: percentiles are within 2 ** (1 - precision) of the value, 0.2% with 1024 counters
+# for a whole run, and 1.6% with 128 counters for each of the many timeline windows
+STATS_PRECISION = 10
+WINDOW_PRECISION = 7
+
+
+def find_latest_phout(directory: Union[str, Path]) -> Path:
+    """
+    The phout log of the newest tank run in the directory
+    """
+    logdirname = max(glob.glob(os.path.join(directory, '*/')), key=os.path.getctime)
+    filename = None
+    for file_name in os.listdir(logdirname):
+        name, end = os.path.splitext(file_name)
+        if name.startswith('phout_') and end == '.log':
+            filename = file_name
+
+    if filename is None:
+        raise FileNotFoundError(f'There is no phout log in {logdirname}')
+
+    return Path(logdirname) / filename
+
+
+def find_phouts(directory: Union[str, Path]) -> List[Path]:
+    """
+    Phout logs of all tank runs and load generators under the directory
+    """
+    return sorted(path for path in Path(directory).rglob('phout_*.log') if path.is_file())
+
+
+def select_phouts(directory: Union[str, Path]) -> List[Path]:
+    """
+    The phout log of the newest run, or with ALL_PHOUTS=1 the logs of every run and load generator
+    under the directory, to be merged
+    """
+    if os.environ.get('ALL_PHOUTS'):
+        return find_phouts(directory)
+    return [find_latest_phout(directory)]
+
+
+def parse_phout(data: bytes) -> np.ndarray:
+    """
+    Parses complete phout lines into a structured array with PHOUT_DTYPE fields
+    """
+    if not data.strip():
+        return np.zeros(0, dtype=PHOUT_DTYPE)
+    return np.loadtxt(io.BytesIO(data), delimiter='\t', usecols=PHOUT_USECOLS, dtype=PHOUT_DTYPE,
+                      comments=None, ndmin=1)
+
+
+def read_phout(path: Union[str, Path], chunk_size: int = CHUNK_SIZE) -> Iterator[np.ndarray]:
+    """
+    Streams the phout log as structured arrays of at most `chunk_size` bytes of lines each,
+    so the memory doesn't depend on the log size
+    """
+    with open(path, 'rb') as phout:
+        tail = b''
+        while True:
+            chunk = phout.read(chunk_size)
+            if not chunk:
+                break
+
+            chunk = tail + chunk
+            end = chunk.rfind(b'\n') + 1
+            tail = chunk[end:]
+            if end:
+                yield parse_phout(chunk[:end])
+
+        if tail:
+            yield parse_phout(tail)
+
+
+class PhoutStats:
+    """
+    Status code counts and a response time histogram of phout records, collected chunk by chunk.
+    Stats of several logs or load generators are combined with `merge`
+    """
+
+    def __init__(self, precision: int = STATS_PRECISION):
+        self.count = 0
+        self.status_codes: Dict[int, int] = dict()
+        self.timings = LatencyHistogram(precision)
+
+    def add(self, records: np.ndarray):
+        self.count += len(records)
+
+        codes, counts = np.unique(records['proto_code'], return_counts=True)
+        for code, count in zip(codes.tolist(), counts.tolist()):
+            self.status_codes[code] = self.status_codes.get(code, 0) + count
+
+        self.timings.add(records['interval_real'])
+
+    def merge(self, other: PhoutStats) -> PhoutStats:
+        self.count += other.count
+        for code, count in other.status_codes.items():
+            self.status_codes[code] = self.status_codes.get(code, 0) + count
+        self.timings.merge(other.timings)
+        return self
+
+    def count_codes(self, predicate: Callable[[int], bool]) -> int:
+        return sum(count for code, count in self.status_codes.items() if predicate(code))
+
+    def ratio(self, predicate: Callable[[int], bool]) -> float:
+        if self.count == 0:
+            return 0.0
+        return self.count_codes(predicate) / self.count
+
+    def error_ratio(self) -> float:
+        """
+        Share of the responses with 5xx status codes
+        """
+        return self.ratio(lambda code: code // 100 == 5)
+
+    def percentile(self, q: float) -> float:
+        """
+        Response time percentile, in microseconds, within the histogram error
+        """
+        return self.timings.percentile(q)
+
+
+def analyze_phout(path: Union[str, Path], chunk_size: int = CHUNK_SIZE) -> PhoutStats:
+    stats = PhoutStats()
+    for records in read_phout(path, chunk_size):
+        stats.add(records)
+    return stats
+
+
+class PhoutTimeline:
+    """
+    PhoutStats of phout records split into time windows by the timestamp column.
+    Windows are keyed by their index, i.e. the start time divided by the window length
+    """
+
+    def __init__(self, window: float = 1.0, precision: int = WINDOW_PRECISION):
+        self.window = window
+        self.precision = precision
+        self.windows: Dict[int, PhoutStats] = dict()
+
+    def add(self, records: np.ndarray):
+        if len(records) == 0:
+            return
+
+        keys = np.floor(records['time'] / self.window).astype(np.int64)
+        # Records are almost ordered by time, so the stable sort is cheap
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        records = records[order]
+
+        bounds = np.flatnonzero(np.diff(keys)) + 1
+        for key, window_records in zip(keys[np.r_[0, bounds]].tolist(), np.split(records, bounds)):
+            stats = self.windows.get(key)
+            if stats is None:
+                stats = self.windows[key] = PhoutStats(self.precision)
+            stats.add(window_records)
+
+    def merge(self, other: PhoutTimeline) -> PhoutTimeline:
+        if other.window != self.window:
+            raise ValueError(f'Unable to merge timelines with windows {self.window} and {other.window}')
+
+        for key, stats in other.windows.items():
+            if key in self.windows:
+                self.windows[key].merge(stats)
+            else:
+                self.windows[key] = PhoutStats(self.precision).merge(stats)
+        return self
+
+    def items(self) -> Iterator[Tuple[float, PhoutStats]]:
+        """
+        Window start times and stats, in the time order
+        """
+        for key in sorted(self.windows):
+            yield key * self.window, self.windows[key]
+
+    def rps(self, stats: PhoutStats) -> float:
+        return stats.count / self.window
+
+    def steady(self, warm_up: float = 0.0, cool_down: float = 0.0) -> PhoutTimeline:
+        """
+        The timeline without the windows starting in the first `warm_up` seconds of the run
+        and the windows ending in its last `cool_down` seconds
+        """
+        timeline = PhoutTimeline(self.window, self.precision)
+        if not self.windows:
+            return timeline
+
+        begin = min(self.windows) * self.window + warm_up
+        end = (max(self.windows) + 1) * self.window - cool_down
+        for key, stats in self.windows.items():
+            if key * self.window >= begin and (key + 1) * self.window <= end:
+                timeline.windows[key] = stats
+        return timeline
+
+    def report(self, percentiles: Sequence[float] = (50, 90, 99)) -> List[dict]:
+        report = list()
+        for start, stats in self.items():
+            row = {'time': start, 'rps': self.rps(stats), 'status_codes': dict(stats.status_codes)}
+            for q in percentiles:
+                row[f'p{q:g}'] = stats.percentile(q)
+            report.append(row)
+        return report
+
+
+def analyze_phout_timeline(path: Union[str, Path], window: float = 1.0, chunk_size: int = CHUNK_SIZE,
+                           warm_up: float = 0.0, cool_down: float = 0.0) -> PhoutTimeline:
+    """
+    Timeline of a single log. The warm-up and the cool-down are cut here rather than after merging,
+    as every run merged with ALL_PHOUTS has its own
+    """
+    timeline = PhoutTimeline(window)
+    for records in read_phout(path, chunk_size):
+        timeline.add(records)
+    return timeline.steady(warm_up, cool_down)
+
+
+class PhoutAnalysis:
+    """
+    PhoutStats and PhoutTimeline of the same records, collected in a single pass over a log
+    """
+
+    def __init__(self, window: float = 1.0):
+        self.stats = PhoutStats()
+        self.timeline = PhoutTimeline(window)
+
+    def add(self, records: np.ndarray):
+        self.stats.add(records)
+        self.timeline.add(records)
+
+    def merge(self, other: PhoutAnalysis) -> PhoutAnalysis:
+        self.stats.merge(other.stats)
+        self.timeline.merge(other.timeline)
+        return self
+
+
+def analyze_phout_with_timeline(path: Union[str, Path], window: float = 1.0, chunk_size: int = CHUNK_SIZE,
+                                warm_up: float = 0.0, cool_down: float = 0.0) -> PhoutAnalysis:
+    """
+    Stats of the whole log and its timeline, cut as `analyze_phout_timeline` does
+    """
+    analysis = PhoutAnalysis(window)
+    for records in read_phout(path, chunk_size):
+        analysis.add(records)
+    analysis.timeline = analysis.timeline.steady(warm_up, cool_down)
+    return analysis
+
+
+def analyze_phouts(paths: Sequence[Union[str, Path]], analyzer: Callable = analyze_phout,
+                   workers: Optional[int] = None):
+    """
+    Analyzes every log with the analyzer in a pool of worker processes and merges the results.
+    The analyzer has to be a module level function returning mergeable stats, e.g. analyze_phout
+    """
+    if len(paths) == 0:
+        raise FileNotFoundError('There are no phout logs to analyze')
+    if len(paths) == 1:
+        return analyzer(paths[0])
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(analyzer, paths))
+
+    merged = results[0]
+    for result in results[1:]:
+        merged.merge(result)
+    return merged
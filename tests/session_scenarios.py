@@ -0,0 +1,93 @@
+"""
+Random games for the reference model, played the same way on several GameServers to check that
+the session engines and the servers built on them give identical results:
+
+    config_path = write_config(tmp_path, offices=True, loot=True)
+    expected = play(GameServer(config_path, seed=1), seed=2)
+    assert play(GameServer(config_path, LazyGameSession, seed=1), seed=2) == expected
+"""
+
+import json
+import random
+
+from pathlib import Path
+from typing import Iterator, List
+
+from game_server import GameServer, Point
+
+# Adjoining collinear roads, crossings, and a road sticking out past the others, so the players
+# hit road ends and cross from road to road
+ROADS = [
+    {'x0': 0, 'y0': 0, 'x1': 10},
+    {'x0': 10, 'y0': 0, 'x1': 25},
+    {'x0': 25, 'y0': 0, 'y1': 30},
+    {'x0': 0, 'y0': 0, 'y1': 30},
+    {'x0': 0, 'y0': 30, 'x1': 25},
+    {'x0': 5, 'y0': -5, 'y1': 12},
+]
+
+START_POINTS = [Point(x, y) for x in [0, 5, 10, 25] for y in [0, 30]]
+
+TICKS = [1, 7, 50, 100, 333, 1000]
+
+
+def write_config(directory: Path, maps: int = 2, offices: bool = False, loot: bool = False,
+                 retirement_time: float = 4.0) -> Path:
+    game_maps = [{
+        'id': f'map{i}',
+        'name': f'Map {i}',
+        'roads': ROADS,
+        'buildings': [],
+        'offices': [{'id': 'o0', 'x': 20, 'y': 0, 'offsetX': 0, 'offsetY': 0}] if offices else [],
+        'lootTypes': [{'value': 10}, {'value': 5}],
+    } for i in range(maps)]
+
+    config = {'defaultDogSpeed': 3.0, 'dogRetirementTime': retirement_time, 'maps': game_maps}
+    if loot:
+        config['lootGeneratorConfig'] = {'period': 5.0, 'probability': 0.5}
+
+    config_path = directory / 'config.json'
+    with open(config_path, 'w') as f:
+        json.dump(config, f)
+    return config_path
+
+
+def play_steps(server: GameServer, seed: int, tokens: List[str], steps: int = 300, start: int = 0) -> Iterator[List]:
+    """
+    Joins, moves and ticks at random, and yields what the server answered in every step: the retired players,
+    and now and then the states of the players. `tokens` is kept up to date with the players in the game,
+    the players joined in a game continued from `start` get new tokens
+    """
+    rnd = random.Random(seed)
+    map_ids = list(server.maps)
+
+    for step in range(start, start + steps):
+        answers = list()
+        if rnd.random() < 0.3:
+            token = f'{step:032x}'
+            server.join(f'Player {step}', rnd.choice(map_ids), token, step, rnd.choice(START_POINTS))
+            tokens.append(token)
+
+        for token in tokens:
+            if rnd.random() < 0.05:
+                server.move(token, rnd.choice(['L', 'R', 'U', 'D', '']))
+
+        retired = server.tick(rnd.choice(TICKS))
+        answers.append(retired)
+        for token in retired:
+            tokens.remove(token)
+
+        if rnd.random() < 0.1:
+            answers.append([server.get_state(token) for token in tokens])
+        yield answers
+
+
+def play(server: GameServer, seed: int, steps: int = 300) -> List:
+    """
+    Everything the server answered in the game, the states of all the players at the end, and the records
+    """
+    tokens: List[str] = list()
+    log = [answer for answers in play_steps(server, seed, tokens, steps) for answer in answers]
+    log.append([server.get_state(token) for token in tokens])
+    log.append(server.get_records(0, len(server.records.history)))
+    return log
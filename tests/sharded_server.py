@@ -0,0 +1,170 @@
+"""
+The public API of GameServer with the sessions spread over worker processes. Sessions on different maps are
+independent, so every worker owns the sessions of its maps and ticks them in parallel with the others.
+The results are identical to the serial GameServer given the same seed. The sessions aren't reachable
+from the parent process, so it isn't a GameServer, and it can't be saved with SnapshotWriter:
+
+    with ShardedGameServer(config_path, seed=1) as server:
+        server.join(...)
+        server.tick(100)
+"""
+
+from __future__ import annotations
+
+import os
+import multiprocessing
+
+from multiprocessing.connection import Connection
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from game_server import GameServer, GameSession, MapCatalog, Point, load_catalog
+from leaderboard import Leaderboard
+
+
+def tick_shard(server: GameServer, ticks: int) -> List[Tuple[str, dict]]:
+    records_before = len(server.records)
+    retired = server.tick(ticks)
+    return list(zip(retired, server.records.added_since(records_before)))
+
+
+SHARD_COMMANDS = {
+    'join': GameServer.join,
+    'get_state': GameServer.get_state,
+    'get_state_delta': GameServer.get_state_delta,
+    'move': GameServer.move,
+    'set_lost_objects': GameServer.set_lost_objects,
+    'tick': tick_shard,
+}
+
+
+def run_shard(connection: Connection, config_file_name: Path, session_type: Type[GameSession], seed: Optional[int]):
+    """
+    Worker loop: runs the commands on its own GameServer until None is received
+    """
+    server = GameServer(config_file_name, session_type, seed)
+    while True:
+        message = connection.recv()
+        if message is None:
+            break
+
+        command, args = message
+        try:
+            connection.send((True, SHARD_COMMANDS[command](server, *args)))
+        except Exception as ex:
+            connection.send((False, ex))
+    connection.close()
+
+
+class ShardedGameServer:
+
+    def __init__(self, config_file_name: Path, session_type: Type[GameSession] = GameSession,
+                 seed: Optional[int] = None, shards: Optional[int] = None):
+        self.catalog: MapCatalog = load_catalog(config_file_name)
+        self.maps: Optional[Dict[str, dict]] = self.catalog.maps
+        self.records = Leaderboard()
+
+        shards = shards if shards is not None else os.cpu_count()
+        self.connections: List[Connection] = list()
+        self.processes: List[multiprocessing.Process] = list()
+        for _ in range(shards):
+            connection, worker_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=run_shard, daemon=True,
+                                              args=(worker_connection, config_file_name, session_type, seed))
+            process.start()
+            worker_connection.close()
+            self.connections.append(connection)
+            self.processes.append(process)
+
+        # Maps are dealt to the shards in the config order
+        self.shard_by_map: Dict[str, int] = {map_id: i % shards for i, map_id in enumerate(self.maps or [])}
+        self.shard_by_token: Dict[str, int] = dict()
+        # Sessions in the order they are started, the serial server ticks them in this order
+        self.session_order: Dict[str, int] = dict()
+        self.session_by_token: Dict[str, int] = dict()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        for connection in self.connections:
+            connection.send(None)
+            connection.close()
+        for process in self.processes:
+            process.join()
+        self.connections = list()
+        self.processes = list()
+
+    @staticmethod
+    def receive(connection: Connection) -> Any:
+        succeeded, result = connection.recv()
+        if not succeeded:
+            raise result
+        return result
+
+    def call(self, shard: int, command: str, *args) -> Any:
+        self.connections[shard].send((command, args))
+        return ShardedGameServer.receive(self.connections[shard])
+
+    def call_all(self, command: str, *args) -> List[Any]:
+        # All the shards start working before waiting for any of them
+        for connection in self.connections:
+            connection.send((command, args))
+        return [ShardedGameServer.receive(connection) for connection in self.connections]
+
+    def get_map(self, map_id: str) -> Optional[dict]:
+        return self.catalog.get_map(map_id)
+
+    def join(self, username: str, map_id: str, token: str, player_id: int, position: Point) -> bool:
+        if self.get_map(map_id) is None:
+            return False
+
+        shard = self.shard_by_map[map_id]
+        if not self.call(shard, 'join', username, map_id, token, player_id, position):
+            return False
+
+        self.session_order.setdefault(map_id, len(self.session_order))
+        self.shard_by_token[token] = shard
+        self.session_by_token[token] = self.session_order[map_id]
+        return True
+
+    def get_state(self, token: str) -> Optional[dict]:
+        shard = self.shard_by_token.get(token)
+        if shard is None:
+            return None
+        return self.call(shard, 'get_state', token)
+
+    def get_state_delta(self, token: str, since: int) -> Optional[dict]:
+        shard = self.shard_by_token.get(token)
+        if shard is None:
+            return None
+        return self.call(shard, 'get_state_delta', token, since)
+
+    def move(self, token: str, direction: str) -> bool:
+        shard = self.shard_by_token.get(token)
+        if shard is None:
+            return False    # There is no such player
+        return self.call(shard, 'move', token, direction)
+
+    def set_lost_objects(self, token: str, lost_objects: dict) -> bool:
+        shard = self.shard_by_token.get(token)
+        if shard is None:
+            return False
+        return self.call(shard, 'set_lost_objects', token, lost_objects)
+
+    def get_records(self, start: int = 0, max_items: int = 100) -> List[dict]:
+        return self.records.get(start, max_items)
+
+    def tick(self, ticks: int) -> List[str]:
+        retired = [pair for shard_retired in self.call_all('tick', ticks) for pair in shard_retired]
+
+        # The same order as the serial server retires players in: by session, then by retirement
+        retired.sort(key=lambda pair: self.session_by_token[pair[0]])
+        for token, record in retired:
+            del self.shard_by_token[token]
+            del self.session_by_token[token]
+            self.records.add(record)
+        return [token for token, _ in retired]
@@ -0,0 +1,158 @@
+import json
+
+import pytest
+
+from cpp_server_api import STATE_SCHEMA, DataInconsistency, WrongFields, WrongType, stream_object
+from json_stream import JsonStream
+
+DOCUMENTS = [
+    '{}',
+    '[]',
+    '{"a": [1, -2, 3.5, -0.25e-3, 1E+21, 0], "b": {"c": {"d": []}}, "e": [[], {}, [[null]]]}',
+    '[true, false, null, "", "x", 12345678901234567890, 1.7976931348623157e308]',
+    '{"escapes": "quote \\" backslash \\\\ slash \\/ \\b\\f\\n\\r\\t", "unicode": "\\u00e9\\ud83d\\ude00 \\u0000"}',
+    '{"utf-8": "é ж 中 😀", "ключ": ["значение", {"😀": "é"}]}',
+    ' \n\t{ "spaced" :\r\n [ 1 , 2 ] , "out" : { } } \n',
+    json.dumps({str(i): {'pos': [i * 1.5, -i / 3], 'dir': 'LRUD'[i % 4], 'bag': [{'id': i}] * (i % 3)}
+                for i in range(20)}),
+]
+
+MALFORMED = [
+    '{"a": 1,}',
+    '{"a" 1}',
+    '{1: 2}',
+    '[1 2]',
+    '[1,]',
+    '{"a": tru}',
+    '{"a": "unterminated}',
+    '{"a": "bad \\x escape"}',
+    '{"a": 1.}',
+    '{"a": -}',
+    '[01]',
+    '{"a": 1} {}',
+    '{"a": 1}]',
+]
+
+# Not UTF-8: a stray continuation byte, and a lead byte with no continuation
+MALFORMED_UTF8 = [b'{"a": "\x80"}', b'["\xc3"]']
+
+
+def read(stream: JsonStream, depth: int):
+    """
+    Walks the containers down to `depth` with `members` and `items`, and decodes the values below it whole
+    """
+    character = stream.peek()
+    if depth == 0 or character not in '{[':
+        return stream.value()
+    if character == '{':
+        return {key: read(stream, depth - 1) for key in stream.members()}
+    return [read(stream, depth - 1) for _ in stream.items()]
+
+
+def read_document(chunks, depth: int):
+    stream = JsonStream(chunks)
+    value = read(stream, depth)
+    stream.finish()
+    return value
+
+
+def split(data: bytes, boundary: int):
+    return [data[:boundary], data[boundary:]]
+
+
+@pytest.mark.parametrize('depth', [0, 1, 100])
+@pytest.mark.parametrize('document', DOCUMENTS)
+def test_every_chunk_boundary(document, depth):
+    data = document.encode()
+    expected = json.loads(document)
+    for boundary in range(len(data) + 1):
+        assert read_document(split(data, boundary), depth) == expected, boundary
+
+    # Single bytes split every multibyte character and escape, and empty chunks come in between
+    assert read_document([data[i:i + 1] for i in range(len(data))], depth) == expected
+    assert read_document([b''] + [piece for i in range(len(data)) for piece in (data[i:i + 1], b'')], depth) == expected
+
+
+@pytest.mark.parametrize('document', DOCUMENTS)
+def test_truncated(document):
+    data = document.strip().encode()
+    for end in range(len(data)):
+        for chunks in ([data[:end]], split(data[:end], end // 2)):
+            with pytest.raises(json.JSONDecodeError):
+                read_document(chunks, 100)
+
+
+@pytest.mark.parametrize('depth', [0, 100])
+@pytest.mark.parametrize('document', MALFORMED)
+def test_malformed(document, depth):
+    with pytest.raises(json.JSONDecodeError):
+        json.loads(document)
+
+    data = document.encode()
+    for boundary in range(len(data) + 1):
+        with pytest.raises(json.JSONDecodeError):
+            read_document(split(data, boundary), depth)
+
+
+@pytest.mark.parametrize('data', MALFORMED_UTF8)
+def test_malformed_utf8(data):
+    for boundary in range(len(data) + 1):
+        with pytest.raises(json.JSONDecodeError):
+            read_document(split(data, boundary), 100)
+
+
+def stream_state(chunks) -> dict:
+    """
+    The state put together from what `stream_object` yields
+    """
+    stream = JsonStream(chunks)
+    state = dict()
+    for field, key, value in stream_object(stream, STATE_SCHEMA):
+        if key is None:
+            state[field] = value
+        elif type(key) is int:
+            state[field].append(value)
+        else:
+            state[field][key] = value
+    stream.finish()
+    return state
+
+
+STATE = {
+    'players': {
+        '0': {'pos': [0.0, 10.5], 'speed': [0.0, -3.25], 'dir': 'D', 'bag': [{'id': 1, 'type': 0}], 'score': 10},
+        '1': {'pos': [1e-05, 2.0], 'speed': [0.0, 0.0], 'dir': '', 'bag': [], 'score': 0},
+    },
+    'lostObjects': {'2': {'type': 1, 'pos': [7.0, 0.0]}},
+    'tags': ['a', 'b\\"c'],
+}
+
+
+def test_stream_object_every_chunk_boundary():
+    data = json.dumps(STATE).encode()
+    for boundary in range(len(data) + 1):
+        assert stream_state(split(data, boundary)) == STATE, boundary
+    assert stream_state([data[i:i + 1] for i in range(len(data))]) == STATE
+
+
+@pytest.mark.parametrize('state, error, name', [
+    ({'players': {'0': {'pos': [0.0, 1], 'speed': [0.0, 0.0], 'dir': 'U'}}}, WrongType, 'Player position'),
+    ({'players': {'0': {'pos': [0.0, 1.0], 'speed': [0.0, 0.0]}}}, WrongFields, 'Player state'),
+    ({'players': [{'pos': [0.0, 1.0], 'speed': [0.0, 0.0], 'dir': 'U'}]}, WrongType, 'Game state, players'),
+    ({'lostObjects': {}}, WrongType, 'Game state, players'),
+    ([], WrongType, 'Game state'),
+])
+def test_stream_object_errors(state, error, name):
+    data = json.dumps(state).encode()
+    for boundary in range(len(data) + 1):
+        with pytest.raises(DataInconsistency) as ex:
+            stream_state(split(data, boundary))
+        assert type(ex.value) is error
+        assert ex.value.args[0] == name
+
+
+def test_stream_object_truncated():
+    data = json.dumps(STATE).encode()
+    for end in range(len(data)):
+        with pytest.raises(json.JSONDecodeError):
+            stream_state(split(data[:end], end // 2))
@@ -0,0 +1,121 @@
+import copy
+import json
+
+import pytest
+
+from cpp_server_api import (CppServer, DataInconsistency, MAP_SCHEMA, STATE_DELTA_SCHEMA, STATE_SCHEMA, UnexpectedData,
+                            WrongFields, WrongType, stream_object)
+from json_stream import JsonStream
+
+MAP = {
+    'id': 'map1',
+    'name': 'Map 1',
+    'dogSpeed': 4.0,
+    'roads': [{'x0': 0, 'y0': 0, 'x1': 40}, {'x0': 40, 'y0': 0, 'y1': 30.5}],
+    'buildings': [{'x': 5, 'y': 5, 'w': 30, 'h': 20}],
+    'offices': [{'id': 'o0', 'x': 40, 'y': 30, 'offsetX': 5, 'offsetY': 0}],
+}
+
+STATE = {
+    'players': {
+        '0': {'pos': [0.0, 0.0], 'speed': [0.0, 0.0], 'dir': 'U'},
+        '1': {'pos': [10.0, 0.0], 'speed': [-4.0, 0.0], 'dir': 'L', 'bag': [], 'score': 0},
+    },
+    'lostObjects': {'0': {'type': 0, 'pos': [5.0, 0.0]}},
+}
+
+STATE_DELTA = {
+    'version': 3,
+    'full': False,
+    'players': {'1': {'pos': [10.0, 0.0], 'speed': [-4.0, 0.0], 'dir': 'L'}},
+    'removed': ['0'],
+}
+
+
+def mutated(payload, change):
+    payload = copy.deepcopy(payload)
+    change(payload)
+    return payload
+
+
+def validate_streamed(payload, schema):
+    # Small chunks, so the values are split between them
+    text = json.dumps(payload).encode()
+    stream = JsonStream(text[i:i + 7] for i in range(0, len(text), 7))
+    for _ in stream_object(stream, schema):
+        pass
+    stream.finish()
+
+
+VALIDATORS = {
+    MAP_SCHEMA: CppServer.validate_map,
+    STATE_SCHEMA: CppServer.validate_state,
+    STATE_DELTA_SCHEMA: CppServer.validate_state_delta,
+}
+
+
+@pytest.mark.parametrize('streamed', [False, True])
+@pytest.mark.parametrize('schema, payload', [(MAP_SCHEMA, MAP), (STATE_SCHEMA, STATE),
+                                             (STATE_DELTA_SCHEMA, STATE_DELTA), (STATE_SCHEMA, {'players': {}})])
+def test_valid(streamed, schema, payload):
+    if streamed:
+        validate_streamed(payload, schema)
+    else:
+        VALIDATORS[schema](payload)
+
+
+@pytest.mark.parametrize('streamed', [False, True])
+@pytest.mark.parametrize('schema, payload, error, name', [
+    (MAP_SCHEMA, [MAP], WrongType, 'Map'),
+    (MAP_SCHEMA, mutated(MAP, lambda m: m.pop('offices')), WrongFields, 'Map'),
+    (MAP_SCHEMA, mutated(MAP, lambda m: m.update(name=5)), WrongType, 'name'),
+    (MAP_SCHEMA, mutated(MAP, lambda m: m.update(roads={})), WrongType, 'roads'),
+    (MAP_SCHEMA, mutated(MAP, lambda m: m['roads'].append(None)), WrongType, 'Road'),
+    (MAP_SCHEMA, mutated(MAP, lambda m: m['roads'][1].update(x1=0)), WrongFields, 'Road'),
+    (MAP_SCHEMA, mutated(MAP, lambda m: m['roads'][0].update(x1='40')), WrongType, 'Road coordinate x1'),
+    (MAP_SCHEMA, mutated(MAP, lambda m: m['buildings'][0].pop('h')), WrongFields, 'Building on the map'),
+    (MAP_SCHEMA, mutated(MAP, lambda m: m['buildings'][0].update(y=None)), WrongType, 'Building field y'),
+    (MAP_SCHEMA, mutated(MAP, lambda m: m['buildings'][0].update(w=0)), DataInconsistency,
+     'Building size is\'t positive'),
+    (MAP_SCHEMA, mutated(MAP, lambda m: m['offices'][0].pop('offsetY')), WrongFields, 'Office on the map'),
+    (MAP_SCHEMA, mutated(MAP, lambda m: m['offices'][0].update(id=0)), WrongType, 'Office field id'),
+    (MAP_SCHEMA, mutated(MAP, lambda m: m.update(dogSpeed=4)), WrongType, 'dogSpeed'),
+    (MAP_SCHEMA, mutated(MAP, lambda m: m.update(dogSpeed=-1.0)), DataInconsistency, 'Dog speed can\'t be negative'),
+    (STATE_SCHEMA, 'state', WrongType, 'Game state'),
+    (STATE_SCHEMA, {}, WrongType, 'Game state, players'),
+    (STATE_SCHEMA, {'players': []}, WrongType, 'Game state, players'),
+    (STATE_SCHEMA, mutated(STATE, lambda s: s['players'].update({'2': []})), WrongType, 'player_id'),
+    (STATE_SCHEMA, mutated(STATE, lambda s: s['players']['0'].pop('dir')), WrongFields, 'Player state'),
+    (STATE_SCHEMA, mutated(STATE, lambda s: s['players']['1'].update(pos=[10, 0.0])), WrongType, 'Player position'),
+    (STATE_SCHEMA, mutated(STATE, lambda s: s['players']['1'].update(speed=None)), WrongType, 'speed'),
+    (STATE_SCHEMA, mutated(STATE, lambda s: s['players']['1'].update(dir=1)), WrongType, 'dir'),
+    (STATE_SCHEMA, mutated(STATE, lambda s: s['players']['1'].update(dir='X')), UnexpectedData, 'Player direction'),
+    (STATE_DELTA_SCHEMA, mutated(STATE_DELTA, lambda d: d.pop('version')), WrongFields, 'Game state delta'),
+    (STATE_DELTA_SCHEMA, mutated(STATE_DELTA, lambda d: d.update(full=0)), WrongType, 'Game state delta, full'),
+    (STATE_DELTA_SCHEMA, mutated(STATE_DELTA, lambda d: d.update(removed=[0])), WrongType, 'Removed player id'),
+    (STATE_DELTA_SCHEMA, mutated(STATE_DELTA, lambda d: d.update(lostObjects=[])), WrongType,
+     'Game state delta, lost objects'),
+])
+def test_mutated(streamed, schema, payload, error, name):
+    with pytest.raises(DataInconsistency) as ex:
+        if streamed:
+            validate_streamed(payload, schema)
+        else:
+            VALIDATORS[schema](payload)
+
+    assert type(ex.value) is error
+    assert ex.value.args[0] == name
+
+
+def test_top_level_types_checked_first():
+    # The offices aren't a list, and a road before them is broken too. The types of the map fields are checked
+    # before any road, as the hand-written checks did
+    game_map = mutated(MAP, lambda m: m.update(offices={}, roads=[{'x0': 0}]))
+    with pytest.raises(WrongType) as ex:
+        CppServer.validate_map(game_map)
+    assert ex.value.parent_object == 'offices'
+
+    state = {'players': {'0': {'pos': [0], 'speed': 0, 'dir': 'U'}}}
+    with pytest.raises(WrongType) as ex:
+        CppServer.validate_state(state)
+    assert ex.value.parent_object == 'speed'
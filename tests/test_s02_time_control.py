@@ -2,15 +2,28 @@ import os
 import random
 import pytest
 import pathlib
+import functools
 
 import game_server as game
-from game_server import Point, Vector2D, Direction
+from cpp_server_api import StateMirror
+from game_server import Point, Vector2D, Direction, GameSession
+from lazy_session import LazyGameSession
+from session_scenarios import write_config, play
+from sharded_server import ShardedGameServer
+from vectorized_session import VectorizedGameSession
+
+# The reference engine the C++ server is compared with, SESSION_TYPE=vectorized or lazy speeds up the games of 10k+ dogs
+SESSION_TYPES = {
+    'plain': GameSession,
+    'vectorized': VectorizedGameSession,
+    'lazy': LazyGameSession,
+}
 
 
 @pytest.fixture()
 def game_server():
     config_path = pathlib.Path(os.environ['CONFIG_PATH'])
-    yield game.GameServer(config_path)
+    yield game.GameServer(config_path, SESSION_TYPES[os.environ.get('SESSION_TYPE', 'plain')])
 
 
 def get_states(server, game_server: game.GameServer, token):
@@ -128,12 +141,22 @@ def test_match_roads(server, game_server):
     assert py_maps == server_maps
     for i in range(0, len(py_maps)):
         py_map = game_server.get_map(py_maps[i]['id'])
-        if 'dogSpeed' in py_map.keys():
-            py_map.pop('dogSpeed')
+        py_map = {key: value for key, value in py_map.items() if key != 'dogSpeed'}
         server_map = server.get_map(server_maps[i]['id'])
         assert py_map == server_map
 
 
+def test_stream_maps(server):
+    for server_map in server.get_maps():
+        streamed = dict()
+        for field, key, value in server.stream_map(server_map['id']):
+            if key is None:
+                streamed[field] = value     # Lists start empty, their items follow
+            else:
+                streamed[field].append(value)
+        assert streamed == server.get_map(server_map['id'])
+
+
 @pytest.mark.parametrize('direction', ['R', 'L', 'U', 'D'])
 def test_turn_one_player(server_one_test, game_server, direction, map_id):
     token, _ = add_player(server_one_test, game_server, map_id, 'player')
@@ -296,3 +319,56 @@ def test_two_players_sequences(server_one_test, game_server, map_id):
 
         compare_states(state_1, py_state_1)
         compare_states(state_2, py_state_2)
+
+
+def test_state_mirror_sequences(server_one_test, game_server, map_id):
+    tokens = [add_player(server_one_test, game_server, map_id, f'Player {i}')[0] for i in range(3)]
+    # The reference state is polled by deltas, only the players changed since the previous poll come
+    mirror = StateMirror(functools.partial(game_server.get_state_delta, tokens[0]))
+    compare_states(server_one_test.get_state(tokens[0]), mirror.update())
+
+    for _ in range(0, 10):
+        # Some players keep their direction, so the deltas don't hold all of them
+        for token in random.sample(tokens, random.randint(0, len(tokens))):
+            move_players(server_one_test, game_server, token, Direction.random_str())
+
+        tick_both(server_one_test, game_server, random.randint(0, 10000))
+        compare_states(server_one_test.get_state(tokens[0]), mirror.update())
+
+
+def test_stream_state_sequences(server_one_test, game_server, map_id):
+    tokens = [add_player(server_one_test, game_server, map_id, f'Player {i}')[0] for i in range(3)]
+
+    for _ in range(0, 10):
+        for token in tokens:
+            move_players(server_one_test, game_server, token, Direction.random_str())
+        tick_both(server_one_test, game_server, random.randint(0, 10000))
+
+        # The players are validated one by one while the body arrives
+        players = {key: value for field, key, value in server_one_test.stream_state(tokens[0])
+                   if field == 'players' and key is not None}
+        compare_states({'players': players}, game_server.get_state(tokens[0]))
+
+
+@pytest.mark.parametrize('offices', [False, True])
+@pytest.mark.parametrize('seed', range(5))
+def test_vectorized_session_matches(tmp_path, offices, seed):
+    config_path = write_config(tmp_path, offices=offices, loot=True)
+    expected = play(game.GameServer(config_path, GameSession, seed=seed), seed)
+    assert play(game.GameServer(config_path, VectorizedGameSession, seed=seed), seed) == expected
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_sharded_server_matches(tmp_path, seed):
+    config_path = write_config(tmp_path, maps=5, offices=True, loot=True)
+    expected = play(game.GameServer(config_path, seed=seed), seed)
+    with ShardedGameServer(config_path, seed=seed, shards=3) as server:
+        assert play(server, seed) == expected
+
+
+@pytest.mark.parametrize('offices, loot', [(False, False), (True, False), (True, True)])
+@pytest.mark.parametrize('seed', range(5))
+def test_lazy_session_matches(tmp_path, offices, loot, seed):
+    config_path = write_config(tmp_path, offices=offices, loot=loot)
+    expected = play(game.GameServer(config_path, GameSession, seed=seed), seed)
+    assert play(game.GameServer(config_path, LazyGameSession, seed=seed), seed) == expected
@@ -1,26 +1,28 @@
 import os
-import glob
 
 from pathlib import Path
 
 import pytest
 
+from phout import analyze_phouts, select_phouts
 
-@pytest.fixture
+
+@pytest.fixture(scope='module')
 def directory():
     return Path(os.environ['DIRECTORY'])
 
 
-def test_only_200(directory):
-    logdirname = max(glob.glob(os.path.join(directory, '*/')), key=os.path.getctime)
-    filename = ''
-    for file_name in os.listdir(logdirname):
-        name, end = os.path.splitext(file_name)
-        if name.startswith('phout_') and end == '.log':
-            filename = file_name
+@pytest.fixture(scope='module')
+def phouts(directory):
+    return select_phouts(directory)
+
+
+@pytest.fixture(scope='module')
+def stats(phouts):
+    # The logs are parsed once for the module
+    return analyze_phouts(phouts)
+
 
-    with open(os.path.join(logdirname, filename)) as phout:
-        lines = phout.readlines()
-        print(lines[:10])
-        for line in lines:
-            assert line.split()[-1] == '200'
+def test_only_200(stats):
+    print(stats.status_codes)
+    assert stats.count_codes(lambda code: code != 200) == 0
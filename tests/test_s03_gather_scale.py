@@ -0,0 +1,76 @@
+import os
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+import gather_scenarios as scenarios
+
+from collision_detector import EVENT_DTYPE, find_gather_events_arrays, try_collect_point
+from game_server import Point
+
+
+@pytest.fixture
+def detector():
+    # collision_detection_scenario_runner, built next to collision_detection_tests from the same CMakeLists.txt
+    if 'DETECTOR_PATH' not in os.environ:
+        pytest.skip('DETECTOR_PATH is not set to a built collision_detection_scenario_runner')
+    return Path(os.environ['DETECTOR_PATH'])
+
+
+@pytest.mark.parametrize('items, gatherers', [(1_000, 100), (100_000, 1_000), (1_000_000, 1_000), (1_000, 1_000_000)])
+@pytest.mark.parametrize('seed', range(2))
+def test_random_scene(detector, tmp_path, items, gatherers, seed):
+    scenario = tmp_path / 'scenario.bin'
+    scenarios.generate_scenario(scenario, items, gatherers, seed)
+
+    events, elapsed = scenarios.run_detector(detector, scenario, tmp_path / 'events.bin')
+    print(f'{items} items, {gatherers} gatherers: {len(events)} events in {elapsed:.3f} s')
+
+    expected = scenarios.find_oracle_events(scenario)
+    scenarios.compare_events(expected, events)
+
+
+def find_events_brute_force(item_positions, item_widths, starts, ends, gatherer_widths) -> np.ndarray:
+    """
+    FindGatherEvents as the C++ reference loops over every gatherer and every item
+    """
+    events = list()
+    for gatherer_id, (start, end, gatherer_width) in enumerate(zip(starts, ends, gatherer_widths)):
+        if start[0] == end[0] and start[1] == end[1]:
+            continue    # The gatherer doesn't move
+        for item_id, (position, item_width) in enumerate(zip(item_positions, item_widths)):
+            result = try_collect_point(Point(*start), Point(*end), Point(*position))
+            if result.is_collected(gatherer_width + item_width):
+                events.append((item_id, gatherer_id, result.sq_distance, result.proj_ratio))
+
+    events = np.array(events, dtype=EVENT_DTYPE)
+    return events[np.lexsort((events['item_id'], events['gatherer_id'], events['time']))]
+
+
+@pytest.mark.parametrize('cell_size', [None, 0.25, 3.0])
+@pytest.mark.parametrize('seed', range(10))
+def test_oracle_matches_brute_force(cell_size, seed):
+    rng = np.random.default_rng(seed)
+    # Coordinates on a half-unit lattice put many items exactly on the collect radius or at the segment ends,
+    # and some gatherers stand still
+    item_positions = rng.integers(0, 20, (200, 2)) / 2
+    item_widths = rng.choice([0.0, 0.5], len(item_positions))
+    starts = rng.integers(0, 20, (50, 2)) / 2
+    ends = np.where(rng.random((50, 1)) < 0.7, starts + rng.integers(-6, 7, (50, 2)) * (rng.random((50, 2)) < 0.5) / 2,
+                    starts)
+    gatherer_widths = rng.choice([0.0, 0.5, 0.6], len(starts))
+
+    expected = find_events_brute_force(item_positions, item_widths, starts, ends, gatherer_widths)
+    events = find_gather_events_arrays(item_positions, item_widths, starts, ends, gatherer_widths, cell_size)
+    assert len(expected) > 0
+    assert events.tolist() == expected.tolist()
+
+
+def test_oracle_radius_boundary():
+    # The item is at the collect radius from the middle of the segment, and at the ends of it
+    item_positions = [[5.0, 0.5], [0.0, 0.0], [10.0, 0.0], [5.0, 0.5000001], [10.0000001, 0.0]]
+    events = find_gather_events_arrays(item_positions, [0.0] * 5, [[0.0, 0.0], [3.0, 3.0]], [[10.0, 0.0], [3.0, 3.0]],
+                                       [0.5, 10.0])
+    assert events.tolist() == [(1, 0, 0.0, 0.0), (0, 0, 0.25, 0.5), (2, 0, 0.0, 1.0)]
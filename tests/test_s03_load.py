@@ -1,49 +1,54 @@
 import os
-import glob
+import functools
 
 from pathlib import Path
 
 import pytest
 
-import numpy as np
+from phout import analyze_phouts, analyze_phout_with_timeline, select_phouts
 
 
-@pytest.fixture
+@pytest.fixture(scope='module')
 def directory():
     return Path(os.environ['DIRECTORY'])
 
 
-def test_only_200(directory):
-    logdirname = max(glob.glob(os.path.join(directory, '*/')), key=os.path.getctime)
-    filename = ''
-    for file_name in os.listdir(logdirname):
-        name, end = os.path.splitext(file_name)
-        if name.startswith('phout_') and end == '.log':
-            filename = file_name
-
-    with open(os.path.join(logdirname, filename)) as phout:
-        lines = phout.readlines()
-        print(lines[:10])
-        for line in lines:
-            assert line.split()[-1] == '200'
-
-
-def test_percentiles(directory):
-    logdirname = max(glob.glob(os.path.join(directory, '*/')), key=os.path.getctime)
-    filename = ''
-    for file_name in os.listdir(logdirname):
-        name, end = os.path.splitext(file_name)
-        if name.startswith('phout_') and end == '.log':
-            filename = file_name
-
-    with open(os.path.join(logdirname, filename)) as phout:
-        lines = phout.readlines()
-        print(lines[:10])
-        timings = []
-        for line in lines:
-            timings.append(float(line.split()[-10]))
-        arr = np.array(timings)
-        p50 = np.percentile(arr, 50)
-        p90 = np.percentile(arr, 90)
-        assert p50 <= 35000 # 35 ms == 35000 microseconds
-        assert p90 <= 50000 # 50 ms == 50000 microseconds
+@pytest.fixture(scope='module')
+def phouts(directory):
+    return select_phouts(directory)
+
+
+@pytest.fixture(scope='module')
+def warm_up():
+    return float(os.environ.get('WARM_UP_SECONDS', '5'))
+
+
+@pytest.fixture(scope='module')
+def analysis(phouts, warm_up):
+    # The logs are parsed once for the module. The last window of every run is cut off by the end of the run
+    return analyze_phouts(phouts, functools.partial(analyze_phout_with_timeline, warm_up=warm_up, cool_down=1.0))
+
+
+def test_only_200(analysis):
+    stats = analysis.stats
+    print(stats.status_codes)
+    assert stats.count_codes(lambda code: code != 200) == 0
+
+
+def test_percentiles(analysis):
+    stats = analysis.stats
+    p50 = stats.percentile(50)
+    p90 = stats.percentile(90)
+    print(p50, p90, stats.percentile(99), stats.percentile(99.9))
+    assert p50 <= 35000 # 35 ms == 35000 microseconds
+    assert p90 <= 50000 # 50 ms == 50000 microseconds
+
+
+def test_steady_state_percentiles(analysis):
+    timeline = analysis.timeline
+    for row in timeline.report():
+        print(row)
+
+    for start, stats in timeline.items():
+        assert stats.percentile(50) <= 35000, start # 35 ms == 35000 microseconds
+        assert stats.percentile(90) <= 50000, start # 50 ms == 50000 microseconds
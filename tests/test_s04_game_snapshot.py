@@ -0,0 +1,126 @@
+import numpy as np
+import pytest
+
+from game_server import GameServer, GameSession, Point
+from game_snapshot import SnapshotWriter, load, restore
+from lazy_session import LazyGameSession
+from session_scenarios import write_config, play_steps
+from vectorized_session import VectorizedGameSession
+
+
+def get_columns(players: dict) -> dict:
+    return {key: column.tolist() if isinstance(column, np.ndarray) else list(column)
+            for key, column in players.items()}
+
+
+def compare_snapshots(server: GameServer, snapshots: list):
+    sessions, records = load(snapshots)
+    assert sorted(sessions) == sorted(session.map['id'] for session in server.sessions)
+
+    for session in server.sessions:
+        loaded = get_columns(sessions[session.map['id']]['players'])
+        for key, column in get_columns(session.dump_players()).items():
+            assert loaded[key] == column, key
+        assert loaded['join_time'] == [session.join_times[token] for token in loaded['token']]
+
+    assert records == server.records.history
+
+
+def test_bag_changed_in_place(tmp_path):
+    server = GameServer(write_config(tmp_path, maps=1))
+    token = 'a' * 32
+    server.join('Player', 'map0', token, 0, Point(15.0, 0.0))
+    server.move(token, 'R')
+    server.tick(1000)
+
+    writer = SnapshotWriter(server)
+    snapshots = [writer.save()]
+
+    # The player picks the item up on the way back, and returns to the saved position, speed and direction
+    server.set_lost_objects(token, {'0': {'type': 0, 'pos': [16.0, 0.0]}})
+    server.move(token, 'L')
+    server.tick(1000)
+    server.move(token, 'R')
+    server.tick(1000)
+    assert server.get_state(token)['players']['0']['bag'] == [{'id': 0, 'type': 0}]
+
+    snapshots.append(writer.save_delta())
+    compare_snapshots(server, snapshots)
+
+
+@pytest.mark.parametrize('session_type', [GameSession, VectorizedGameSession])
+@pytest.mark.parametrize('seed', range(3))
+def test_delta_round_trip(tmp_path, session_type, seed):
+    server = GameServer(write_config(tmp_path, offices=True, loot=True), session_type, seed=seed)
+    writer = SnapshotWriter(server)
+    snapshots = [writer.save()]
+
+    for step, _ in enumerate(play_steps(server, seed, list(), steps=200)):
+        if step % 10 == 9:
+            snapshots.append(writer.save_delta())
+            compare_snapshots(server, snapshots)
+
+
+class MirroredServers:
+    """
+    Makes the same calls on the server and on the restored one, and checks that they answer the same
+    and spawn the same loot
+    """
+
+    def __init__(self, server: GameServer, restored: GameServer):
+        self.server = server
+        self.restored = restored
+        self.maps = server.maps
+
+    def call(self, method: str, *args):
+        result = getattr(self.server, method)(*args)
+        assert getattr(self.restored, method)(*args) == result, method
+        return result
+
+    def join(self, *args) -> bool:
+        return self.call('join', *args)
+
+    def move(self, *args) -> bool:
+        return self.call('move', *args)
+
+    def get_state(self, token: str):
+        return self.call('get_state', token)
+
+    def tick(self, ticks: int):
+        retired = self.call('tick', ticks)
+        for session in self.server.sessions:
+            restored = self.restored.get_session(session.map['id'])
+            assert restored.get_lost_objects_state() == session.get_lost_objects_state()
+            assert restored.next_loot_id == session.next_loot_id
+        return retired
+
+
+@pytest.mark.parametrize('session_type', [GameSession, VectorizedGameSession, LazyGameSession])
+@pytest.mark.parametrize('seed', range(3))
+def test_restore(tmp_path, session_type, seed):
+    config_path = write_config(tmp_path, offices=True, loot=True)
+    server = GameServer(config_path, session_type, seed=seed)
+    for map_id in server.maps:
+        server.get_session(map_id)  # The restored server doesn't know the seed of sessions missing in the snapshots
+
+    writer = SnapshotWriter(server)
+    snapshots = [writer.save()]
+    tokens = list()
+    for step, _ in enumerate(play_steps(server, seed, tokens, steps=100)):
+        if step % 10 == 9:
+            snapshots.append(writer.save_delta())
+
+    restored = restore(config_path, snapshots, session_type)
+    assert restored.get_records(0, 1000) == server.get_records(0, 1000)
+
+    mirrored = MirroredServers(server, restored)
+    for token in tokens:
+        mirrored.get_state(token)
+    for _ in play_steps(mirrored, seed + 100, tokens, steps=200, start=100):
+        pass
+
+    for token in tokens:
+        mirrored.get_state(token)
+    assert restored.get_records(0, 1000) == server.get_records(0, 1000)
+    assert len(server.records.history) > 0
+
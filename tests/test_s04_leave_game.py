@@ -1,14 +1,18 @@
-from cpp_server_api import CppServer
+from cpp_server_api import CppServer, AsyncCppServer
 import math
+import asyncio
+import itertools
 import random
 import pytest
 import os
 
 import requests
 
-from game_server import Direction
+from game_server import Direction, GameServer, Point, load_catalog
+from leaderboard import Leaderboard, record_key
 from dataclasses import dataclass
-from typing import List
+from pathlib import Path
+from typing import Awaitable, Iterable, List
 
 
 import psycopg2
@@ -39,8 +43,10 @@ def _make_server(xprocess):
 
     _, output_path = xprocess.ensure("server", Starter)
     xprocess.getinfo("server")
-    yield CppServer(f'http://{server_domain}:{server_port}/', output_path)
+    server = CppServer(f'http://{server_domain}:{server_port}/', output_path)
+    yield server
 
+    server.close()
     xprocess.getinfo("server").terminate()
 
 
@@ -57,13 +63,29 @@ def postgres_server(xprocess):
         yield result
 
 
+@pytest.fixture(scope='function')
+def async_server(postgres_server):
+    # One thread pool for all the tribes of a test
+    server = AsyncCppServer(postgres_server)
+    yield server
+    server.close()
+
+
 def compare(records: List[dict], tribe_records: List[dict]):
     assert len(records) == len(tribe_records)
+    tribe_records_by_name = {t_record['name']: t_record for t_record in tribe_records}
     for record in records:
-        name = record['name']
-        for t_record in tribe_records:
-            if t_record['name'] == name:
-                math.isclose(record['score'], t_record['score'])
+        t_record = tribe_records_by_name.get(record['name'])
+        assert t_record is not None, record['name']
+        assert math.isclose(record['score'], t_record['score']), record['name']
+
+    # Both are ordered by the score (descending), the play time and the name. The Tribe only estimates the play
+    # time, so the players with equal scores may come in any order
+    def group_by_score(some_records: List[dict]) -> List[set]:
+        return [{record['name'] for record in group}
+                for _, group in itertools.groupby(some_records, key=lambda record: record['score'])]
+
+    assert group_by_score(records) == group_by_score(tribe_records)
 
 
 @dataclass
@@ -89,15 +111,26 @@ class Player:
         state = server.get_player_state(self.token, self.player_id)
         self.score = state['score']
 
+    async def update_score_async(self, server: AsyncCppServer):
+        state = await server.get_player_state(self.token, self.player_id)
+        self.score = state['score']
+
+
+def run_concurrently(calls: Iterable[Awaitable]) -> list:
+    async def gather():
+        return await asyncio.gather(*calls)
+    return asyncio.run(gather())
+
 
 class Tribe:
 
-    def __init__(self, server, map_id: str, num_of_players: int = 10, prefix: str = 'Player'):
-        self.server: None = server
+    def __init__(self, async_server: AsyncCppServer, map_id: str, num_of_players: int = 10, prefix: str = 'Player'):
+        self.server: CppServer = async_server.server
+        self.async_server = async_server
         self.players: List[Player] = list()
-        for i in range(0, num_of_players):
-            name = f'{prefix} {i}'
-            token, player_id = server.join(name, map_id)
+        names = [f'{prefix} {i}' for i in range(0, num_of_players)]
+        joined = run_concurrently(self.async_server.join(name, map_id) for name in names)
+        for name, (token, player_id) in zip(names, joined):
             self.players.append(Player(name, token, player_id))
 
     def __getitem__(self, index: int) -> Player:
@@ -110,19 +143,13 @@ class Tribe:
     # def
 
     def get_list(self) -> list:
-        self.players.sort(key=lambda x: x.score, reverse=True)
-        res = [pl.get_dict() for pl in self.players]
-
-        return res
+        return sorted((pl.get_dict() for pl in self.players), key=record_key)
 
     def update_scores(self):
-        for player in self.players:
-            player.update_score(self.server)
+        run_concurrently(pl.update_score_async(self.async_server) for pl in self.players)
 
     def randomized_turn(self):
-        for pl in self.players:
-            direction = Direction.random_str()
-            self.server.move(pl.token, direction)
+        run_concurrently(self.async_server.move(pl.token, Direction.random_str()) for pl in self.players)
 
     def randomized_move(self):
         r_time = get_retirement_time(self.server)
@@ -133,13 +160,17 @@ class Tribe:
         tick_seconds(self.server, seconds)
 
     def stop(self):
-        for pl in self.players:
-            self.server.move(pl.token, '')
+        run_concurrently(self.async_server.move(pl.token, '') for pl in self.players)
+
+
+DEFAULT_RETIREMENT_TIME = 10.0
 
 
 def get_retirement_time(server) -> float:
-    # How can it be extracted?
-    return 10.0
+    config_path = os.environ.get('CONFIG_PATH')
+    if config_path is None:
+        return DEFAULT_RETIREMENT_TIME
+    return load_catalog(Path(config_path)).config.get('dogRetirementTime', DEFAULT_RETIREMENT_TIME)
 
 
 def tick_seconds(server, seconds: float):
@@ -165,6 +196,13 @@ def get_records(server, start: int = 0, max_items: int = 100) -> list:
     return res_json
 
 
+def get_state_status(server, token: str) -> int:
+    request = '/api/v1/game/state'
+    header = {'content-type': 'application/json',
+              'Authorization': f'Bearer {token}'}
+    return server.request('GET', header, request).status_code
+
+
 def test_clean_records(postgres_server):
     res_json = get_records(postgres_server)
     assert len(res_json) == 0
@@ -217,8 +255,8 @@ def test_retirement_one_player(postgres_server: CppServer, map_id):
     assert math.isclose(float(records[0]['score']), score)
 
 
-def test_a_few_zero_records(postgres_server, map_id):
-    tribe = Tribe(postgres_server, map_id)
+def test_a_few_zero_records(postgres_server, async_server: AsyncCppServer, map_id):
+    tribe = Tribe(async_server, map_id)
     r_time = get_retirement_time(postgres_server)
     tribe.update_scores()
     tick_seconds(postgres_server, r_time)
@@ -228,8 +266,8 @@ def test_a_few_zero_records(postgres_server, map_id):
     compare(records, tribe_records)
 
 
-def test_a_few_records(postgres_server: CppServer, map_id):
-    tribe = Tribe(postgres_server, map_id)
+def test_a_few_records(postgres_server: CppServer, async_server: AsyncCppServer, map_id):
+    tribe = Tribe(async_server, map_id)
     r_time = get_retirement_time(postgres_server)
 
     for _ in range(0, random.randint(100, 350)):
@@ -245,8 +283,8 @@ def test_a_few_records(postgres_server: CppServer, map_id):
     compare(records, tribe_records)
 
 
-def test_old_young_tribes_records(postgres_server: CppServer, map_id):
-    old_tribe = Tribe(postgres_server, map_id, prefix='Elder')
+def test_old_young_tribes_records(postgres_server: CppServer, async_server: AsyncCppServer, map_id):
+    old_tribe = Tribe(async_server, map_id, prefix='Elder')
     r_time = get_retirement_time(postgres_server)
 
     for _ in range(0, random.randint(50, 200)):
@@ -257,7 +295,7 @@ def test_old_young_tribes_records(postgres_server: CppServer, map_id):
     old_tribe.add_time(r_time / 2)
     old_tribe.stop()
 
-    young_tribe = Tribe(postgres_server, map_id, prefix='Infant')
+    young_tribe = Tribe(async_server, map_id, prefix='Infant')
 
     for _ in range(0, random.randint(50, 200)):
         young_tribe.randomized_turn()
@@ -279,8 +317,8 @@ def test_old_young_tribes_records(postgres_server: CppServer, map_id):
     compare(records, tribe_records)
 
 
-def test_a_hundred_records(postgres_server: CppServer, map_id):
-    tribe = Tribe(postgres_server, map_id, num_of_players=100)
+def test_a_hundred_records(postgres_server: CppServer, async_server: AsyncCppServer, map_id):
+    tribe = Tribe(async_server, map_id, num_of_players=100)
     r_time = get_retirement_time(postgres_server)
 
     for _ in range(0, random.randint(10, 35)):
@@ -297,8 +335,8 @@ def test_a_hundred_records(postgres_server: CppServer, map_id):
     compare(records, tribe_records)
 
 
-def test_a_hundred_plus_records(postgres_server: CppServer, map_id):
-    tribe = Tribe(postgres_server, map_id, num_of_players=150)
+def test_a_hundred_plus_records(postgres_server: CppServer, async_server: AsyncCppServer, map_id):
+    tribe = Tribe(async_server, map_id, num_of_players=150)
     r_time = get_retirement_time(postgres_server)
     for _ in range(0, random.randint(10, 35)):
         tribe.randomized_move()
@@ -313,8 +351,8 @@ def test_a_hundred_plus_records(postgres_server: CppServer, map_id):
     compare(records, tribe_records)
 
 
-def test_two_sequential_tribes_records(postgres_server: CppServer, map_id):
-    red_foxes = Tribe(postgres_server, map_id, num_of_players=50, prefix='Red fox')
+def test_two_sequential_tribes_records(postgres_server: CppServer, async_server: AsyncCppServer, map_id):
+    red_foxes = Tribe(async_server, map_id, num_of_players=50, prefix='Red fox')
     r_time = get_retirement_time(postgres_server)
 
     for _ in range(0, random.randint(10, 35)):
@@ -325,11 +363,11 @@ def test_two_sequential_tribes_records(postgres_server: CppServer, map_id):
 
     tick_seconds(postgres_server, r_time)
     red_foxes.add_time(r_time)
-    tribe_records = red_foxes.get_list()
+    leaderboard = Leaderboard(red_foxes.get_list())
     records = get_records(postgres_server)
-    compare(records, tribe_records)
+    compare(records, leaderboard.get())
 
-    orange_raccoons = Tribe(postgres_server, map_id, num_of_players=50, prefix='Orange Raccoon')
+    orange_raccoons = Tribe(async_server, map_id, num_of_players=50, prefix='Orange Raccoon')
 
     for _ in range(0, random.randint(10, 35)):
         orange_raccoons.randomized_move()
@@ -340,20 +378,51 @@ def test_two_sequential_tribes_records(postgres_server: CppServer, map_id):
     tick_seconds(postgres_server, r_time)
     orange_raccoons.add_time(r_time)
 
-    tribe_records.extend(orange_raccoons.get_list())
-    tribe_records.sort(key=lambda x: x['score'], reverse=True)
+    leaderboard.extend(orange_raccoons.get_list())
 
     records = get_records(postgres_server)
-    compare(records, tribe_records)
+    compare(records, leaderboard.get())
+
+
+def test_retirements_match_reference(postgres_server: CppServer, map_id):
+    reference = GameServer(Path(os.environ['CONFIG_PATH']))
+    r_time = get_retirement_time(postgres_server)
+    reference.retirement_time = r_time
+
+    tokens = list()
+    for i in range(20):
+        token, player_id = postgres_server.join(f'Player {i}', map_id)
+        state = postgres_server.get_player_state(token, player_id)
+        reference.join(f'Player {i}', map_id, token, player_id, Point(*state['pos']))
+        tokens.append(token)
+
+    for _ in range(50):
+        for token in tokens:
+            if random.random() < 0.3:
+                direction = random.choice(['L', 'R', 'U', 'D', ''])
+                postgres_server.move(token, direction)
+                reference.move(token, direction)
+
+        ticks = random.randint(100, int(r_time * 900))
+        postgres_server.tick(ticks)
+        retired = set(reference.tick(ticks))
+
+        for token in tokens:
+            assert get_state_status(postgres_server, token) == (401 if token in retired else 200)
+        tokens = [token for token in tokens if token not in retired]
+
+    records = get_records(postgres_server)
+    assert len(records) == len(reference.records)
 
 
 @pytest.mark.skip
 @pytest.mark.randomize(min_num=0, max_num=50, ncalls=3)
 @pytest.mark.randomize(min_num=0, max_num=100, ncalls=3)
 @pytest.mark.randomize(min_num=0, max_num=100, ncalls=3)
-def test_a_records_selection(postgres_server, map_id, start: int, max_items: int, extra_players: int):
+def test_a_records_selection(postgres_server, async_server: AsyncCppServer, map_id,
+                             start: int, max_items: int, extra_players: int):
 
-    tribe = Tribe(postgres_server, map_id, num_of_players=start + extra_players)
+    tribe = Tribe(async_server, map_id, num_of_players=start + extra_players)
 
     r_time = get_retirement_time(postgres_server)
 
@@ -366,8 +435,7 @@ def test_a_records_selection(postgres_server, map_id, start: int, max_items: int
     tick_seconds(postgres_server, r_time)
     tribe.add_time(r_time)
 
-    end = min(start + extra_players, start + max_items)
-    tribe_records = tribe.get_list()[start:end]
+    tribe_records = Leaderboard(tribe.get_list()).get(start, max_items)
     records = get_records(postgres_server, start, max_items)
     compare(records, tribe_records)
 
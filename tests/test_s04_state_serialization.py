@@ -70,6 +70,7 @@ def run_server(state, remove_state=False):
     try:
         yield server, container
     finally:
+        server.close()
         try:
             container.stop()
         except docker.errors.APIError:
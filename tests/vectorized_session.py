@@ -0,0 +1,316 @@
+from __future__ import annotations
+
+import logging
+import weakref
+
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Union
+
+import numpy as np
+
+from game_server import (DEFAULT_BAG_CAPACITY, CompiledMap, Direction, GameSession, LootGenerator, LostObject, Point,
+                         get_speed)
+
+
+@dataclass(frozen=True)
+class RoadArrays:
+    """
+    Road boxes and the road index flattened into a dense CSR table: roads of the cell `c` are
+    `cell_roads[cell_offsets[c]:cell_offsets[c + 1]]`, in the map order. The arrays are read-only,
+    as they are shared by all sessions on the map
+    """
+
+    left_bottom: np.ndarray
+    right_top: np.ndarray
+    cell_origin: np.ndarray
+    cell_shape: np.ndarray
+    cell_offsets: np.ndarray
+    cell_roads: np.ndarray
+
+
+# Road arrays live as long as their compiled map
+_road_arrays: weakref.WeakKeyDictionary[CompiledMap, RoadArrays] = weakref.WeakKeyDictionary()
+
+
+def compile_road_arrays(compiled_map: CompiledMap) -> RoadArrays:
+    arrays = _road_arrays.get(compiled_map)
+    if arrays is None:
+        arrays = _road_arrays[compiled_map] = build_road_arrays(compiled_map)
+    return arrays
+
+
+def build_road_arrays(compiled_map: CompiledMap) -> RoadArrays:
+    roads = compiled_map.roads
+    left_bottom = np.array([road.left_bottom_corner.to_list() for road in roads], dtype=np.float64).reshape(-1, 2)
+    right_top = np.array([road.right_top_corner.to_list() for road in roads], dtype=np.float64).reshape(-1, 2)
+
+    cells = compiled_map.road_index.cells
+    if len(cells) == 0:
+        cell_origin = np.zeros(2, dtype=np.int64)
+        cell_shape = np.zeros(2, dtype=np.int64)
+        cell_offsets = np.zeros(1, dtype=np.int64)
+        cell_roads = np.zeros(0, dtype=np.int64)
+    else:
+        keys = np.array(list(cells.keys()), dtype=np.int64)
+        cell_origin = keys.min(axis=0)
+        cell_shape = keys.max(axis=0) - cell_origin + 1
+
+        local = keys - cell_origin
+        flat_keys = local[:, 0] * cell_shape[1] + local[:, 1]
+        counts = np.zeros(int(cell_shape.prod()), dtype=np.int64)
+        counts[flat_keys] = [len(cell) for cell in cells.values()]
+
+        cell_offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=cell_offsets[1:])
+        cell_roads = np.zeros(cell_offsets[-1], dtype=np.int64)
+        for flat_key, cell in zip(flat_keys.tolist(), cells.values()):
+            start = cell_offsets[flat_key]
+            cell_roads[start:start + len(cell)] = cell
+
+    arrays = RoadArrays(left_bottom, right_top, cell_origin, cell_shape, cell_offsets, cell_roads)
+    for array in (left_bottom, right_top, cell_origin, cell_shape, cell_offsets, cell_roads):
+        array.setflags(write=False)
+    return arrays
+
+
+class VectorizedGameSession(GameSession):
+    """
+    Drop-in replacement for GameSession that keeps positions and speeds of all players
+    in contiguous NumPy arrays and advances the whole session in one vectorized step.
+    The results are identical to GameSession, so it can be passed to GameServer as a session type
+    """
+
+    def __init__(self, game_map: dict, default_speed, loot_generator: Optional[LootGenerator] = None,
+                 seed: Optional[Union[int, str]] = None, default_bag_capacity: int = DEFAULT_BAG_CAPACITY,
+                 retirement_time: Optional[float] = None, capacity: int = 16):
+        super().__init__(game_map, default_speed, loot_generator, seed, default_bag_capacity, retirement_time)
+
+        self.positions = np.zeros((capacity, 2), dtype=np.float64)
+        self.speeds = np.zeros((capacity, 2), dtype=np.float64)
+        self.directions = np.full(capacity, Direction.U.value, dtype=np.int8)
+        self.idle = np.zeros(capacity, dtype=bool)
+        self.ids: List[int] = list()
+        self.player_tokens: List[str] = list()
+        self.names: List[str] = list()
+        self.bags: List[List[LostObject]] = list()
+        self.scores: List[int] = list()
+        self.tokens: Dict[str, int] = dict()
+        self.size = 0
+
+        road_arrays = compile_road_arrays(self.compiled_map)
+        self.left_bottom = road_arrays.left_bottom
+        self.right_top = road_arrays.right_top
+        self.cell_origin = road_arrays.cell_origin
+        self.cell_shape = road_arrays.cell_shape
+        self.cell_offsets = road_arrays.cell_offsets
+        self.cell_roads = road_arrays.cell_roads
+
+    def reserve(self, capacity: int):
+        if capacity <= len(self.positions):
+            return
+        capacity = max(capacity, 2 * len(self.positions))
+        for name in ('positions', 'speeds', 'directions', 'idle'):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def add_player(self, name: str, token: str, _id: int, position: Point):
+        self.reserve(self.size + 1)
+        index = self.size
+        self.positions[index] = position.to_list()
+        self.speeds[index] = 0.0
+        self.directions[index] = Direction.U.value
+        self.idle[index] = True
+        self.ids.append(_id)
+        self.player_tokens.append(token)
+        self.names.append(name)
+        self.bags.append(list())
+        self.scores.append(0)
+        self.tokens[token] = index
+        self.size += 1
+        self.changed_players[token] = None
+        self.join_times[token] = self.time
+        self.set_idle(token, True, self.time)
+
+    def has_player(self, token: str) -> bool:
+        return token in self.tokens
+
+    def move(self, token: str, direction: str) -> bool:
+        index = self.tokens.get(token)
+        if index is None:
+            return False
+
+        self.speeds[index] = get_speed(direction, self.default_speed).to_list()
+        try:
+            self.directions[index] = Direction[direction].value
+        except KeyError:
+            pass    # leave the direction unchanged
+        self.changed_players[token] = None
+        return True
+
+    def serialize_players(self, tokens: Iterable[str]) -> Dict[str, dict]:
+        indices = [self.tokens[token] for token in tokens]
+        return {str(self.ids[index]): player_state
+                for index, player_state in zip(indices, self.get_players_state(indices))}
+
+    def get_players_state(self, indices: List[int]) -> List[dict]:
+        # The rows are converted in one call per array, not per player
+        positions = self.positions[indices].tolist()
+        speeds = self.speeds[indices].tolist()
+        directions = self.directions[indices].tolist()
+        return [{
+            'pos': positions[i],
+            'speed': speeds[i],
+            'dir': str(Direction(directions[i])),
+            'bag': [lost_object.get_bag_state() for lost_object in self.bags[index]],
+            'score': self.scores[index]
+        } for i, index in enumerate(indices)]
+
+    def mark_changed(self, index: int):
+        self.changed_players[self.player_tokens[index]] = None
+
+    def get_bag(self, index: int) -> List[LostObject]:
+        return self.bags[index]
+
+    def add_score(self, index: int, points: int):
+        self.scores[index] += points
+
+    def dump_players(self) -> dict:
+        return {
+            'id': np.array(self.ids, dtype=np.int64),
+            'token': list(self.player_tokens),
+            'name': list(self.names),
+            'position': self.positions[:self.size].copy(),
+            'speed': self.speeds[:self.size].copy(),
+            'direction': self.directions[:self.size].copy(),
+            'score': np.array(self.scores, dtype=np.int64),
+            'bag': [[(lost_object.id, lost_object.type) for lost_object in bag] for bag in self.bags],
+        }
+
+    def load_players(self, players: dict):
+        count = len(players['id'])
+        begin = self.size
+        end = begin + count
+        self.reserve(end)
+        self.positions[begin:end] = players['position']
+        self.speeds[begin:end] = players['speed']
+        self.directions[begin:end] = players['direction']
+
+        tokens = list(players['token'])
+        self.ids.extend(np.asarray(players['id']).tolist())
+        self.player_tokens.extend(tokens)
+        self.names.extend(players['name'])
+        self.scores.extend(np.asarray(players['score']).tolist())
+        self.bags.extend([LostObject(loot_id, loot_type, Point(0.0, 0.0)) for loot_id, loot_type in bag]
+                         for bag in players['bag'])
+        self.idle[begin:end] = [token in self.idle_since for token in tokens]
+        self.tokens.update((token, begin + i) for i, token in enumerate(tokens))
+        self.size = end
+        self.changed_players.update(dict.fromkeys(tokens))
+
+    def remove_players(self, tokens: List[str]) -> Dict[str, dict]:
+        records = dict()
+        keep = np.ones(self.size, dtype=bool)
+        for token in tokens:
+            index = self.tokens.pop(token)
+            keep[index] = False
+            self.drop_player_state(str(self.ids[index]))
+            self.changed_players.pop(token, None)
+            records[token] = self.make_record(token, self.names[index], self.scores[index])
+
+        size = int(np.count_nonzero(keep))
+        for name in ('positions', 'speeds', 'directions', 'idle'):
+            array = getattr(self, name)
+            array[:size] = array[:self.size][keep]
+
+        kept = np.flatnonzero(keep).tolist()
+        for name in ('ids', 'names', 'bags', 'scores', 'player_tokens'):
+            values = getattr(self, name)
+            setattr(self, name, [values[i] for i in kept])
+        self.tokens = {token: index for index, token in enumerate(self.player_tokens)}
+        self.size = size
+        return records
+
+    def tick(self, ticks: int):
+        tick_start = self.time
+        self.time += ticks
+        positions = self.positions[:self.size]
+        speeds = self.speeds[:self.size]
+        starts = positions.copy()
+
+        # Only the moving players change, the ones standing still stay in place
+        moving = (speeds != 0).any(axis=1)
+        self.changed_players.update(dict.fromkeys([self.player_tokens[index]
+                                                   for index in np.flatnonzero(moving).tolist()]))
+
+        estimated = positions + speeds * (ticks / 1000)
+        new_positions = self.bounded_move_all(positions, estimated)
+
+        # The same as `Point.__eq__`, i.e. math.isclose with the default tolerance
+        close = (new_positions == estimated) | \
+            (np.abs(new_positions - estimated) <= 1e-09 * np.maximum(np.abs(new_positions), np.abs(estimated)))
+        stopped = ~close.all(axis=1)
+
+        positions[:] = new_positions
+        speeds[stopped] = 0.0
+
+        # Only the players that stopped or started moving are visited
+        idle = (speeds == 0).all(axis=1)
+        for index in np.flatnonzero(idle != self.idle[:self.size]).tolist():
+            self.set_idle(self.player_tokens[index], bool(idle[index]), tick_start)
+        self.idle[:self.size] = idle
+
+        self.gather(starts, positions)
+        self.spawn_loot(ticks, self.size)
+
+    def bounded_move_all(self, start_points: np.ndarray, stop_points: np.ndarray) -> np.ndarray:
+        """
+        Vectorized `GameSession.bounded_move`: every stop point is bounded by the start point's roads,
+        the farthest result wins, and the first road in the map order wins a tie
+        """
+        count = len(start_points)
+        if count == 0:
+            return stop_points
+
+        # Candidate (player, road) pairs from the start point's grid cells
+        cells = np.floor(start_points / self.road_index.cell_size).astype(np.int64)
+        local = cells - self.cell_origin
+        inside = ((local >= 0) & (local < self.cell_shape)).all(axis=1)
+        flat = np.where(inside, local[:, 0] * self.cell_shape[1] + local[:, 1], 0)
+        starts = self.cell_offsets[flat]
+        counts = np.where(inside, self.cell_offsets[flat + 1] - starts, 0)
+
+        pair_players = np.repeat(np.arange(count), counts)
+        pair_offsets = np.arange(len(pair_players)) - np.repeat(np.cumsum(counts) - counts, counts)
+        pair_roads = self.cell_roads[np.repeat(starts, counts) + pair_offsets]
+
+        pair_starts = start_points[pair_players]
+        on_road = ((self.left_bottom[pair_roads] <= pair_starts) &
+                   (pair_starts <= self.right_top[pair_roads])).all(axis=1)
+        pair_players = pair_players[on_road]
+        pair_roads = pair_roads[on_road]
+        pair_starts = pair_starts[on_road]
+
+        bounded = np.maximum(self.left_bottom[pair_roads],
+                             np.minimum(self.right_top[pair_roads], stop_points[pair_players]))
+        distances = np.sqrt(((bounded - pair_starts) ** 2).sum(axis=1))
+
+        result = start_points.copy()
+        winners = np.zeros(0, dtype=np.int64)
+
+        if len(pair_players) != 0:
+            # Pairs are grouped by player, so the group maximum is found with a single reduction
+            group_starts = np.flatnonzero(np.r_[True, pair_players[1:] != pair_players[:-1]])
+            max_distances = np.full(count, -np.inf)
+            max_distances[pair_players[group_starts]] = np.maximum.reduceat(distances, group_starts)
+
+            farthest = np.flatnonzero(distances == max_distances[pair_players])
+            winners, first = np.unique(pair_players[farthest], return_index=True)
+            result[winners] = bounded[farthest[first]]
+
+        if len(winners) != count:
+            for i in np.setdiff1d(np.arange(count), winners):
+                logging.warning("Player is not on the road. Position: %s, Map: %s",
+                                str(Point(*start_points[i])), self.map['id'])
+        return result